@@ -0,0 +1,76 @@
+"""Memory benchmark of the PriorityPoints retained in a window.
+
+Creates linked trajectories of points, as kept in the window and trips of
+the BWC algorithms, and measures the bytes per retained point (tracemalloc),
+the garbage collections triggered while creating them and the time of a
+full collection with all of them alive. The slotted PriorityPoint is
+compared with the same fields stored in a per-instance __dict__.
+
+    python -m benchmarks.priority_point
+"""
+import gc
+import time
+import tracemalloc
+
+from src.helpers.utility import PriorityPoint
+
+
+class DictPoint:
+    """The PriorityPoint fields in a __dict__ (the layout without slots)."""
+
+    @classmethod
+    def from_values(cls, tid, t, x, y, sog=None, cog=None, srid=4326, px=None, py=None):
+        self = cls.__new__(cls)
+        self.tid, self.t, self.x, self.y = tid, t, x, y
+        self.sog, self.cog, self.srid = sog, cog, srid
+        self.px, self.py = px, py
+        self.priority, self.prev, self.next, self.heap_seq = 0, None, None, None
+        self._point = None
+        return self
+
+
+def create_points(cls, size, trips=1000):
+    """size points of trips interleaved in time, linked to the previous one of their trip."""
+    last = {}
+    points = []
+    for i in range(size):
+        tid = i % trips
+        point = cls.from_values(tid, i * 1_000_000_000, 12.5 + i * 1e-7, 55.5 - i * 1e-7, 10.0, 90.0)
+        point.priority = float(i)
+        point.prev = last.get(tid)
+        if point.prev is not None:
+            point.prev.next = point
+        last[tid] = point
+        points.append(point)
+    return points
+
+
+def measure(cls, size):
+    """(bytes per point, collections while creating, seconds of a full collection)."""
+    gc.collect()
+    collections = sum(stats["collections"] for stats in gc.get_stats())
+    tracemalloc.start()
+    points = create_points(cls, size)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    collections = sum(stats["collections"] for stats in gc.get_stats()) - collections
+
+    start = time.perf_counter()
+    gc.collect()
+    collect = time.perf_counter() - start
+    del points
+    return allocated / size, collections, collect
+
+
+def main(sizes=(100_000, 1_000_000, 3_000_000)):
+    print(
+        f"{'points':>10} {'layout':>8} {'bytes/point':>12} {'collections':>12} {'full gc (s)':>12}"
+    )
+    for size in sizes:
+        for name, cls in (("dict", DictPoint), ("slots", PriorityPoint)):
+            per_point, collections, collect = measure(cls, size)
+            print(f"{size:>10} {name:>8} {per_point:>12.1f} {collections:>12} {collect:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
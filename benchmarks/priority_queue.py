@@ -0,0 +1,85 @@
+"""Micro-benchmark of the Windowed priority queue.
+
+Simulates the ingest pattern of the BWC algorithms on a full window: every
+new point is added, the previous point of its trajectory is re-scored, the
+lowest priority point is evicted and its two neighbours are re-scored.
+
+    python -m benchmarks.priority_queue
+"""
+import random
+import time
+
+from sortedcontainers import SortedList
+
+from src.helpers.priority_queue import PriorityQueue
+
+
+class Item:
+    def __init__(self, priority):
+        self.priority = priority
+        self.heap_seq = None
+        self.queued = True
+
+
+def run_sortedlist(size, operations, seed=0):
+    rng = random.Random(seed)
+    queue = SortedList(key=lambda x: x.priority)
+    items = [Item(rng.random()) for _ in range(size)]
+    for item in items:
+        queue.add(item)
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        new = Item(rng.random())
+        queue.add(new)
+        for neighbour in (items[rng.randrange(size)],):
+            if neighbour.queued:
+                queue.remove(neighbour)
+                neighbour.priority = rng.random()
+                queue.add(neighbour)
+        removed = queue.pop(0)
+        removed.queued = False
+        for neighbour in (items[rng.randrange(size)], items[rng.randrange(size)]):
+            if not neighbour.queued:
+                continue
+            queue.remove(neighbour)
+            neighbour.priority += removed.priority
+            queue.add(neighbour)
+        items[rng.randrange(size)] = new
+    return time.perf_counter() - start
+
+
+def run_priority_queue(size, operations, seed=0):
+    rng = random.Random(seed)
+    queue = PriorityQueue()
+    items = [Item(rng.random()) for _ in range(size)]
+    for item in items:
+        queue.add(item)
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        new = Item(rng.random())
+        queue.add(new)
+        for neighbour in (items[rng.randrange(size)],):
+            if neighbour.queued:
+                queue.update(neighbour, rng.random())
+        removed = queue.pop_min()
+        removed.queued = False
+        for neighbour in (items[rng.randrange(size)], items[rng.randrange(size)]):
+            if not neighbour.queued:
+                continue
+            queue.update(neighbour, neighbour.priority + removed.priority)
+        items[rng.randrange(size)] = new
+    return time.perf_counter() - start
+
+
+def main(sizes=(10_000, 100_000, 1_000_000), operations=100_000):
+    print(f"{'items':>10} {'SortedList (s)':>15} {'PriorityQueue (s)':>18} {'speedup':>8}")
+    for size in sizes:
+        reference = run_sortedlist(size, operations)
+        heap = run_priority_queue(size, operations)
+        print(f"{size:>10} {reference:>15.3f} {heap:>18.3f} {reference / heap:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,26 @@
-from sortedcontainers import SortedList
-from src.bwc.windowed import Windowed
-from src.helpers.utility import PriorityPoint, compute_SED
-from pymeos import TGeomPointSeq
-from pymeos.main.tpoint import TGeomPointInst, TGeomPointSeq
-import haversine
-import pandas as pd
+from src.bwc.windowed import Windowed, trips_dataframe
+from src.helpers.utility import (
+    removal_error,
+    timedelta_ns,
+    trajectory_arrays,
+)
+from src.helpers.buffer import TrajectoryBuffer
 
 
 class BWC_STTrace_Imp(Windowed):
-    def __init__(self, points, window_lenght, limit, nys, eval_delta, init_trips):
-        super().__init__(points, window_lenght, limit, nys)
+    def __init__(self, points, window_lenght, limit, nys, eval_delta, init_trips=None, **kwargs):
+        super().__init__(points, window_lenght, limit, nys, **kwargs)
         self.eval_delta = eval_delta
-        self.init_trips = init_trips
+        self.eval_delta_ns = timedelta_ns(eval_delta)
+        self.init_trips = init_trips  # original trips, if None the received points are buffered
+        self.references = {}  # tid -> (t, x, y) arrays of the original trip
+        self.buffers = {}  # tid -> TrajectoryBuffer since the last kept point (if no init_trips)
 
 
     def add_point(self, point):
         """Process the incoming point then remove from queue and update priorities."""
+        if self.init_trips is None:
+            self.buffers.setdefault(point.tid, TrajectoryBuffer()).append(point.t, point.x, point.y)
         existing_len = len(self.window_trips.get(point.tid, [])) + len(
             self.trips.get(point.tid, [])
         )
@@ -24,9 +29,9 @@ class BWC_STTrace_Imp(Windowed):
         else:
             point.priority = float("inf")
         self.priority_list.add(point)
-        self.window_trips.setdefault(point.tid, []).append(point)
+        trip = self.append_point(point)
 
-        if len(self.window_trips[point.tid]) > 1:
+        if len(trip) > 1:
             self.update_priority_antelast_point(point.tid)
 
         while len(self.priority_list) > self.limit:
@@ -39,100 +44,63 @@ class BWC_STTrace_Imp(Windowed):
             # the antelast is the first, therefore we keep priority infinite
             return
 
-        to_update = trip[-2]  # the window_trip size already been checked
-        self.priority_list.remove(to_update)
-        to_update.priority = self.evaluate_point(to_update)
-        self.priority_list.add(to_update)
+        to_update = trip.tail.prev  # the window_trip size already been checked
+        self.priority_list.update(to_update, self.evaluate_point(to_update))
         return
 
     def remove_point(self):
         """Remove point with least priority and update its neighboors' priorities."""
-        to_remove = self.priority_list.pop(0)
-        tid = to_remove.tid
+        to_remove = self.priority_list.pop_min()
+        trip = self.window_trips[to_remove.tid]
 
-        trip = self.window_trips[tid]
-
-        to_remove_index = trip.index(to_remove)
-        del trip[to_remove_index]
+        # only the neighboors inside the window are updated
+        previous = to_remove.prev if to_remove is not trip.head else None
+        following = to_remove.next if to_remove is not trip.tail else None
+        trip.remove(to_remove)
 
         # update priority of the neighboors
-        if to_remove_index > 0:
-            previous = trip[to_remove_index - 1]
-            self.priority_list.remove(previous)
-            previous.priority = self.evaluate_point(previous)
-            self.priority_list.add(previous)
-
-        if to_remove_index < len(trip):
-            following = trip[to_remove_index]
-            self.priority_list.remove(following)
-            following.priority = self.evaluate_point(following)
-            self.priority_list.add(following)
+        if previous is not None:
+            self.priority_list.update(previous, self.evaluate_point(previous))
 
-    def evaluate_point(self, point):
-        """returns the original SED evaluation."""
-
-        def distance_instant_line(instant, line):
-            synchronized_point = line.value_at_timestamp(instant.timestamp())
-            point = instant.value()
-            return (
-                haversine.haversine(
-                    (point.y, point.x), (synchronized_point.y, synchronized_point.x)
-                )
-                * 1000
-            )
-
-        def distance_point_line_time(point, time, line):
-            """Distance between Point and the value of the line at specific time."""
-            synchronized_point = line.value_at_timestamp(time)
-            return (
-                haversine.haversine(
-                    (point.y, point.x), (synchronized_point.y, synchronized_point.x)
-                )
-                * 1000
-            )
-
-        tid = point.tid
-        extended_trip = self.trips.get(tid, [])[-1:] + self.window_trips[tid]
-        point_id = extended_trip.index(point)
+        if following is not None:
+            self.priority_list.update(following, self.evaluate_point(following))
 
+    def evaluate_point(self, point):
+        """returns the increase of error (vs original trip) if point is removed."""
         # normally it should not happen
-        if point_id == 0 or point_id == len(extended_trip) - 1:
+        if point.prev is None or point.next is None:
             return float("inf")
 
-        previous, following = (
-            extended_trip[point_id - 1].point,
-            extended_trip[point_id + 1].point,
+        return removal_error(
+            point.prev,
+            point,
+            point.next,
+            self.reference(point.tid),
+            self.eval_delta_ns,
+            self.distance,
         )
 
-        old_curve = TGeomPointSeq.from_instants([previous, point.point, following])
-        new_curve = TGeomPointSeq.from_instants([previous, following])
-
-        old_error, new_error = 0, 0
-
-        time = previous.timestamp() + self.eval_delta
-        end = following.timestamp()
-
-        if time >= end:
-            return 0
-
-        correct_trip = self.init_trips.loc[tid].trajectory
-
-        while time < end:
-            correct_point = correct_trip.value_at_timestamp(time)
-            new_error += distance_point_line_time(correct_point, time, new_curve)
-            old_error += distance_point_line_time(correct_point, time, old_curve)
-            time += self.eval_delta
-        return new_error - old_error
+    def next_window(self, time):
+        """Close the window, the buffered points before the last kept ones are not needed anymore."""
+        super().next_window(time)
+        for tid, buffer in self.buffers.items():
+            kept = self.trips.get(tid)
+            if kept:
+                buffer.discard_before(kept[-1].t)
+
+    def reference(self, tid):
+        """(t, x, y) arrays of the original trip, extracted once per trip."""
+        if self.init_trips is None:
+            return self.buffers[tid].arrays()
+        if tid not in self.references:
+            self.references[tid] = trajectory_arrays(self.init_trips.loc[tid].trajectory)
+        return self.references[tid]
+
+    def evict_trip(self, tid, time):
+        self.references.pop(tid, None)
+        self.buffers.pop(tid, None)
+        super().evict_trip(tid, time)
 
     def finalize_trips(self):
         """Build TGeomPoint sequences from the kept points."""
-        # traj is a list of PriorityPoints
-        trips_dico = {
-            key: TGeomPointSeq.from_instants([x.point for x in traj], upper_inc=True)
-            for key, traj in self.trips.items()
-        }
-
-        #
-        self.trips = pd.DataFrame.from_dict(
-            trips_dico, orient="index", columns=["trajectory"]
-        )
+        self.trips = trips_dataframe(self.all_trips())
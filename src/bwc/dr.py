@@ -1,27 +1,24 @@
-from sortedcontainers import SortedList
-from shapely.geometry import Point
-from pymeos.main.tpoint import TGeomPointSeq
-import pandas as pd
-from src.bwc.windowed import Windowed
-import src.helpers.utility as u
+import math
 
-from src.helpers.utility import PriorityPoint
+from src.bwc.windowed import Windowed, trips_dataframe, unordered_trips
+import src.helpers.utility as u
 
 
 class BWC_DR(Windowed):
-    def __init__(self, points, window_lenght, limit, nys):
-        super().__init__(points, window_lenght, limit, nys)
+    tail_length = 2  # the extrapolation uses the two previous points
+    projected = True  # distances are computed on the projected coordinates
+
+    def __init__(self, points, window_lenght, limit, nys, **kwargs):
+        super().__init__(points, window_lenght, limit, nys, **kwargs)
 
     def add_point(self, point):
         """Process the incoming point then remove from queue and update priorities."""
         point.priority = float("inf")
         self.priority_list.add(point)
-        self.window_trips.setdefault(point.tid, []).append(point)
-        len_extended = len(self.trips.get(point.tid, [])) + len(
-            self.window_trips[point.tid]
-        )
+        self.append_point(point)
+        previous = point.prev
 
-        if (len_extended > 1 and hasattr(point, "sog")) or (len_extended > 2):
+        if previous is not None and (point.sog is not None or previous.prev is not None):
             self.update_priority_last_point(point)
 
         while len(self.priority_list) > self.limit:
@@ -29,86 +26,61 @@ class BWC_DR(Windowed):
 
     def update_priority_last_point(self, point):
         """Update the priority of the "previous" last point after adding a new point."""
-        self.priority_list.remove(point)
-        point.priority = self.evaluate_point(point)
-        self.priority_list.add(point)
+        self.priority_list.update(point, self.evaluate_point(point))
         return
 
     def remove_point(self):
         """Remove point with least priority and update its neighboors' priorities."""
-        to_remove = self.priority_list.pop(0)
-        tid = to_remove.tid
-        trip = self.window_trips[tid]
-        to_remove_index = trip.index(to_remove)
-        del trip[to_remove_index]
+        to_remove = self.priority_list.pop_min()
+        trip = self.window_trips[to_remove.tid]
+        following = to_remove.next if to_remove is not trip.tail else None
+        trip.remove(to_remove)
 
-        to_update_index = to_remove_index
-        while to_update_index < min(len(trip), to_remove_index + 2):
-            to_update = trip[to_remove_index]
-            self.priority_list.remove(to_update)
-            if to_update_index + len(self.trips.get(tid, [])) == 0:
-                to_update.priority = float("inf")
+        # the two following points were extrapolated using the removed one
+        to_update, updated = following, 0
+        while to_update is not None and updated < 2:
+            if to_update.prev is None:
+                self.priority_list.update(to_update, float("inf"))
             else:
-                to_update.priority = self.evaluate_point(to_update)
-            self.priority_list.add(to_update)
-            to_update_index += 1
+                self.priority_list.update(to_update, self.evaluate_point(to_update))
+            to_update = to_update.next if to_update is not trip.tail else None
+            updated += 1
 
-    def get_expected_pos(self, point) -> Point:
-        """Find the expected position:
+    def get_expected_pos(self, point):
+        """Find the expected (projected) position:
         The expected position found extrapolating current trip until point.timestamp.
         """
-        tid = point.tid
-        extended_trip = self.trips.get(tid, [])[-2:] + self.window_trips[tid]
-        index = extended_trip.index(point)
-
-        if index == 0:
-            # This is bad news, we had to update a point was the first of the trajectory
-            # Shouldn't happen and not witnessed yet.
-            print("bad new:", point.priority)
-            return point  # float("inf") modified for type setting
+        previous = point.prev
 
-        elif hasattr(point, "sog"):
-            return u.get_expected_pos_sog(
-                start=extended_trip[index - 1],
-                time=point.point.timestamp(),
-                nys=self.nys,
-            )
-        elif index <= 1:
-            previous = extended_trip[index - 1]
-            return Point(self.nys(previous.point.value().x, previous.point.value().y))
+        if point.sog is not None:
+            return u.get_expected_pos_sog(start=previous, time=point.t)
+        elif previous.prev is None:
+            return previous.px, previous.py
         else:
             return u.get_expected_pos_anteprev(
-                time=point.point.timestamp(),
-                prev=extended_trip[index - 1],
-                anteprev=extended_trip[index - 2],
-                nys=self.nys,
+                time=point.t,
+                prev=previous,
+                anteprev=previous.prev,
             )
 
     def evaluate_point(self, point):
         """returns the distance between point and the expected position."""
-        expected_pos = self.get_expected_pos(point)
-        current = Point(self.nys(point.point.value().x, point.point.value().y))
-        distance = expected_pos.distance(current)
-        return distance
+        if point.prev is None:
+            # This is bad news, we had to update a point was the first of the trajectory
+            # Shouldn't happen and not witnessed yet.
+            print("bad new:", point.priority)
+            return float("inf")
+        expected_x, expected_y = self.get_expected_pos(point)
+        return math.hypot(point.px - expected_x, point.py - expected_y)
 
     def finalize_trips(self):
-        """Build TGeomPoint sequences from the kept points."""
+        """Build the (lazy) trajectories of the kept points."""
+        self.trips = self.all_trips()
+        self.finalized_trips = trips_dataframe(self.trips)
         # only to check if order  problem!:
-        for key, points in self.trips.items():
-            i = 0
-            flag = False
-            for i in range(len(points) - 1):
-                if points[i].point.timestamp() >= points[i + 1].point.timestamp():
-                    flag = True
-            if flag or len(points) == 0:
-                print("Above")
-                print(key, len(points))
+        for key in unordered_trips(self.finalized_trips):
+            print("Above")
+            print(key, len(self.trips[key]))
 
-        # traj is a list of PriorityPoints
-        trips_dico = {
-            key: TGeomPointSeq.from_instants([x.point for x in traj], upper_inc=True)
-            for key, traj in self.trips.items()
-        }
-        self.finalized_trips = pd.DataFrame.from_dict(
-            trips_dico, orient="index", columns=["trajectory"]
-        )
+    def compressed_trips(self):
+        return self.finalized_trips
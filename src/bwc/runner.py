@@ -0,0 +1,152 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from src.bwc.dr import BWC_DR
+from src.bwc.squish import BWC_SQUISH
+from src.bwc.sttrace import BWC_STTrace
+from src.bwc.sttrace_delay import BWC_STTrace_Delay
+from src.bwc.STTraceImp import BWC_STTrace_Imp
+from src.bwc.STTraceImp_delay import BWC_STTrace_Imp_Delay
+from src.bwc.windowed import trips_dataframe
+from src.helpers.columns import PointColumns
+from src.helpers.shared_arrays import SharedArrays, attach
+from src.helpers.utility import PriorityPoint
+
+# name -> compressor class, the names are the ones used in the tests and results
+ALGORITHMS = {
+    "BWC_Squish": BWC_SQUISH,
+    "BWC_STTrace": BWC_STTrace,
+    "BWC_STTrace_Delay": BWC_STTrace_Delay,
+    "BWC_STTrace_Imp": BWC_STTrace_Imp,
+    "BWC_STTrace_Imp_Delay": BWC_STTrace_Imp_Delay,
+    "BWC_DR": BWC_DR,
+}
+# algorithms comparing with the original trajectory (eval_delta, init_trips)
+IMPROVED = {"BWC_STTrace_Imp", "BWC_STTrace_Imp_Delay"}
+
+# (shm, PointColumns) of the worker processes, set by the pool initializer
+shared = None
+
+
+def create_compressor(name, window_lenght, limit, nys, eval_delta=None, init_trips=None, **kwargs):
+    """Compressor registered under name, without points: they are given with push()."""
+    if name in IMPROVED:
+        kwargs.update(eval_delta=eval_delta, init_trips=init_trips)
+    return ALGORITHMS[name](None, window_lenght, limit, nys, **kwargs)
+
+
+def fan_out(columns, compressors):
+    """Push every point of the columns to all the compressors, in a single pass.
+
+    Each compressor gets its own PriorityPoint (they hold its links and
+    priority) but the columns are decoded and projected only once.
+    """
+    nys = next((compressor.nys for compressor in compressors if compressor.projected), None)
+    srid = columns.srid
+    from_values = PriorityPoint.from_values
+    for tid, t, x, y, sog, cog, px, py in columns.rows(nys):
+        for compressor in compressors:
+            if compressor.projected:
+                compressor.push(from_values(tid, t, x, y, sog, cog, srid, px, py))
+            else:
+                compressor.push(from_values(tid, t, x, y, sog, cog, srid))
+
+
+def compress_all(
+    points,
+    algorithms,
+    window_lenght,
+    limit,
+    nys,
+    eval_delta=None,
+    init_trips=None,
+    workers=None,
+    distance=None,
+):
+    """
+    Compress the points with each of the algorithms (names in ALGORITHMS).
+
+    The points (dataframe or PointColumns) are decoded once. Without workers
+    they are fanned out to all the compressors in a single pass. Otherwise each
+    algorithm runs in a worker process reading the columns from shared memory,
+    the _Imp variants then buffer the received points: init_trips is not used.
+    points can also be an iterable of time ordered PointColumns batches (e.g.
+    read_csv_chunks), pushed as they come (without workers). distance is the
+    distance backend of the compressors (haversine by default).
+    Return the compressed trips (dataframes) and the delays of each algorithm.
+    """
+    if isinstance(points, pd.DataFrame):
+        points = PointColumns.from_dataframe(points)
+    if workers:
+        if not isinstance(points, PointColumns):
+            raise ValueError(
+                "workers need the points as a dataframe or PointColumns, not an iterable of batches"
+            )
+        return compress_in_workers(
+            points, algorithms, window_lenght, limit, nys, eval_delta, workers, distance
+        )
+
+    compressors = {
+        name: create_compressor(
+            name, window_lenght, limit, nys, eval_delta, init_trips, distance=distance
+        )
+        for name in algorithms
+    }
+    for batch in [points] if isinstance(points, PointColumns) else points:
+        fan_out(batch, list(compressors.values()))
+
+    trips, delays = {}, {}
+    for name, compressor in compressors.items():
+        compressor.close()
+        compressor.finalize_trips()
+        trips[name] = compressor.compressed_trips()
+        delays[name] = compressor.delays
+    return trips, delays
+
+
+def compress_in_workers(
+    columns, algorithms, window_lenght, limit, nys, eval_delta, workers, distance=None
+):
+    arrays = {"tid": columns.tid, "t": columns.t, "x": columns.x, "y": columns.y}
+    if columns.sog is not None:
+        arrays.update(sog=columns.sog, cog=columns.cog)
+
+    trips, delays = {}, {}
+    with SharedArrays(arrays) as shared_columns, ProcessPoolExecutor(
+        workers, initializer=attach_columns, initargs=(shared_columns.descriptor, columns.srid)
+    ) as pool:
+        futures = {
+            name: pool.submit(
+                compress_columns, name, window_lenght, limit, nys, eval_delta, distance
+            )
+            for name in algorithms
+        }
+        for name, future in futures.items():
+            kept, delays[name] = future.result()
+            trips[name] = trips_dataframe(
+                {
+                    tid: [PriorityPoint.from_values(tid, *values, columns.srid) for values in points]
+                    for tid, points in kept.items()
+                }
+            )
+    return trips, delays
+
+
+def attach_columns(descriptor, srid):
+    global shared
+    shm, arrays = attach(descriptor)
+    shared = shm, PointColumns(srid=srid, **arrays)
+
+
+def compress_columns(name, window_lenght, limit, nys, eval_delta, distance=None):
+    """Compress the shared columns with an algorithm, return its kept values and delays."""
+    _, columns = shared
+    compressor = create_compressor(name, window_lenght, limit, nys, eval_delta, distance=distance)
+    fan_out(columns, [compressor])
+    compressor.close()
+    kept = {
+        tid: [(point.t, point.x, point.y, point.sog, point.cog) for point in points]
+        for tid, points in compressor.all_trips().items()
+    }
+    return kept, compressor.delays
@@ -1,15 +1,11 @@
-from sortedcontainers import SortedList
-
 import pandas as pd
-from src.helpers.utility import PriorityPoint, compute_SED, convert_trips_points
+from src.helpers.utility import compute_SED_points, convert_trips_points
 from src.bwc.windowed import Windowed
 
-from pymeos import TGeomPointSeq
-
 
 class BWC_SQUISH(Windowed):
-    def __init__(self, points, window_lenght, limit, nys):
-        super().__init__(points, window_lenght, limit, nys)
+    def __init__(self, points, window_lenght, limit, nys, **kwargs):
+        super().__init__(points, window_lenght, limit, nys, **kwargs)
         self.end_priorities = {} # buffered priorities to add to last point
 
     def next_window(self, time):
@@ -17,6 +13,10 @@ class BWC_SQUISH(Windowed):
         super().next_window(time)
         self.end_priorities = {}
 
+    def evict_trip(self, tid, time):
+        self.end_priorities.pop(tid, None)
+        super().evict_trip(tid, time)
+
     def add_point(self, point):
         """Process the incoming point then remove from queue and update priorities."""
         existing_len = len(self.window_trips.get(point.tid, [])) + len(
@@ -27,9 +27,9 @@ class BWC_SQUISH(Windowed):
         else:
             point.priority = float("inf")
         self.priority_list.add(point)
-        self.window_trips.setdefault(point.tid, []).append(point)
+        trip = self.append_point(point)
 
-        if len(self.window_trips[point.tid]) > 1:
+        if len(trip) > 1:
             self.update_priority_antelast_point(point.tid)
 
         while len(self.priority_list) > self.limit:
@@ -42,40 +42,36 @@ class BWC_SQUISH(Windowed):
             # the antelast is the first, therefore we keep priority infinite
             return
 
-        to_update = trip[-2]  # the window_trip size already been checked
-        self.priority_list.remove(to_update)
-        to_update.priority = self.evaluate_point(to_update)
+        to_update = trip.tail.prev  # the window_trip size already been checked
+        priority = self.evaluate_point(to_update)
 
         # if there is a buffered priorities at the end, we add it
         # For instance if we have the trajectory "a b c d" to which e will be added,
         # if for some reason c was dropped before the addition of e, we add the
         # priority of c to d.
         if tid in self.end_priorities:
-            to_update.priority += self.end_priorities.pop(tid)
+            priority += self.end_priorities.pop(tid)
 
-        self.priority_list.add(to_update)
+        self.priority_list.update(to_update, priority)
         return
 
     def remove_point(self):
         """Remove point with least priority and update its neighboors' priorities."""
-        to_remove = self.priority_list.pop(0)
+        to_remove = self.priority_list.pop_min()
         tid = to_remove.tid
         trip = self.window_trips[tid]
-        to_remove_index = trip.index(to_remove)
-        del trip[to_remove_index]
+
+        # only the neighboors inside the window are updated
+        previous = to_remove.prev if to_remove is not trip.head else None
+        following = to_remove.next if to_remove is not trip.tail else None
+        trip.remove(to_remove)
 
         # update priority of the neighboors using SQUISH heuristic
-        if to_remove_index > 0:
-            previous = trip[to_remove_index - 1]
-            self.priority_list.remove(previous)
-            previous.priority += to_remove.priority
-            self.priority_list.add(previous)
-
-        if to_remove_index < len(trip):
-            following = trip[to_remove_index]  # since node already removed
-            self.priority_list.remove(following)
-            following.priority += to_remove.priority
-            self.priority_list.add(following)
+        if previous is not None:
+            self.priority_list.update(previous, previous.priority + to_remove.priority)
+
+        if following is not None:
+            self.priority_list.update(following, following.priority + to_remove.priority)
         else:
             # if there is no following we buffer the priority:
             self.end_priorities[tid] = (
@@ -84,22 +80,13 @@ class BWC_SQUISH(Windowed):
 
     def evaluate_point(self, point):
         """returns the original SED evaluation."""
-        tid = point.tid
-        full_trip = self.trips.get(tid, [])[-1:] + self.window_trips[tid]
-        point_id = full_trip.index(point)
-
         # normally it should not happen because in squish the evaluation is done only at first insertion
         # after, the updating is done by adding the deleted point priority
-        if point_id == 0 or point_id == len(full_trip):
+        if point.prev is None or point.next is None:
             # print("error")
             return float("inf")
         else:
-            return compute_SED(
-                full_trip[point_id - 1].point,
-                point.point,
-                full_trip[point_id + 1].point,
-                self.nys,
-            )
+            return compute_SED_points(point.prev, point, point.next, self.distance)
 
 
 
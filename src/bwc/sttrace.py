@@ -1,15 +1,14 @@
-from sortedcontainers import SortedList
 # import pandas as pd
 from src.bwc.windowed import Windowed
-from src.helpers.utility import PriorityPoint, compute_SED
+from src.helpers.utility import compute_SED_points
 
 # from datetime import timedelta
 # from pymeos import TGeomPointSeq
 
 
 class BWC_STTrace(Windowed):
-    def __init__(self, points, window_lenght, limit, nys):
-        super().__init__(points, window_lenght, limit, nys)
+    def __init__(self, points, window_lenght, limit, nys, **kwargs):
+        super().__init__(points, window_lenght, limit, nys, **kwargs)
 
     def add_point(self, point):
         """Process the incoming point then remove from queue and update priorities."""
@@ -21,9 +20,9 @@ class BWC_STTrace(Windowed):
         else:
             point.priority = float("inf")
         self.priority_list.add(point)
-        self.window_trips.setdefault(point.tid, []).append(point)
+        trip = self.append_point(point)
 
-        if len(self.window_trips[point.tid]) > 1:
+        if len(trip) > 1:
             self.update_priority_antelast_point(point.tid)
 
         while len(self.priority_list) > self.limit:
@@ -36,53 +35,35 @@ class BWC_STTrace(Windowed):
             # the antelast is the first, therefore we keep priority infinite
             return
 
-        to_update = trip[-2]  # the window_trip size already been checked
-        self.priority_list.remove(to_update)
-        to_update.priority = self.evaluate_point(to_update)
-        self.priority_list.add(to_update)
+        to_update = trip.tail.prev  # the window_trip size already been checked
+        self.priority_list.update(to_update, self.evaluate_point(to_update))
         return
 
     def remove_point(self):
         """Remove point with least priority and update its neighboors' priorities."""
-        to_remove = self.priority_list.pop(0)
-        tid = to_remove.tid
+        to_remove = self.priority_list.pop_min()
+        trip = self.window_trips[to_remove.tid]
 
-        trip = self.window_trips[tid]
-
-        to_remove_index = trip.index(to_remove)
-        del trip[to_remove_index]
+        # only the neighboors inside the window are updated
+        previous = to_remove.prev if to_remove is not trip.head else None
+        following = to_remove.next if to_remove is not trip.tail else None
+        trip.remove(to_remove)
 
         # update priority of the neighboors
-        if to_remove_index > 0:
-            previous = trip[to_remove_index - 1]
-            self.priority_list.remove(previous)
-            previous.priority = self.evaluate_point(previous)
-            self.priority_list.add(previous)
-
-        if to_remove_index < len(trip):
-            following = trip[to_remove_index]
-            self.priority_list.remove(following)
-            following.priority = self.evaluate_point(following)
-            self.priority_list.add(following)
+        if previous is not None:
+            self.priority_list.update(previous, self.evaluate_point(previous))
+
+        if following is not None:
+            self.priority_list.update(following, self.evaluate_point(following))
 
     def evaluate_point(self, point):
         """Compute the priority (SED) of point before the new last one of trajectory."""
-        tid = point.tid
-        extended_trip = self.trips.get(tid, [])[-1:] + self.window_trips[tid]
-        point_id = extended_trip.index(point)
-
         # it can happen if we deleted the first point in window (because already points before)
         # or the antelast one
-        if point_id == 0 or point_id == len(extended_trip) - 1:
+        if point.prev is None or point.next is None:
             return float("inf")
         else:
-            return compute_SED(
-                extended_trip[point_id - 1].point,
-                point.point,
-                extended_trip[point_id + 1].point,
-                self.nys,
-            )
-
+            return compute_SED_points(point.prev, point, point.next, self.distance)
 
 
 def classical_STTrace(trips, instants, npoints, nys, delta):
@@ -1,133 +1,91 @@
-from sortedcontainers import SortedList
-
 # import pandas as pd
 from src.bwc.windowed import Windowed
-from src.helpers.utility import PriorityPoint, compute_SED
+from src.helpers.utility import compute_SED_points
+from src.helpers.linked_trip import link
 
 # from datetime import timedelta
 # from pymeos import TGeomPointSeq
 
 
 class BWC_STTrace_Delay(Windowed):
-    def __init__(self, points, window_lenght, limit, nys):
-        super().__init__(points, window_lenght, limit, nys)
+    def __init__(self, points, window_lenght, limit, nys, **kwargs):
+        super().__init__(points, window_lenght, limit, nys, **kwargs)
         self.last_points = {}
 
     def add_point(self, point):
         """Process the incoming point then remove from queue and update priorities."""
         tid = point.tid
-        existing = self.window_trips.get(point.tid, []) + self.trips.get(point.tid, [])
+        previous = self.last_kept(tid)
 
         # First point of trajectory
-        if len(existing) == 0:
+        if previous is None:
             point.priority = float("inf")
             self.priority_list.add(point)
-            self.window_trips.setdefault(point.tid, []).append(point)
+            self.append_point(point)
 
         elif tid not in self.last_points:
+            link(previous, point)
             self.last_points[tid] = point
 
         else:
             old_last = self.last_points[tid]
             self.last_points[tid] = point
-
-            old_last.priority = compute_SED(
-                existing[-1].point, old_last.point, point.point, self.nys
-            )
-            self.window_trips.setdefault(tid, []).append(old_last)
+            self.append_point(old_last)
+            link(old_last, point)
+            old_last.priority = self.evaluate_point(old_last)
             self.priority_list.add(old_last)
 
         while len(self.priority_list) > self.limit:
             self.remove_point()
 
-    def find_neighboors(self, point):
-        """We cannot suppose that there exist always a previous"""
-        tid = point.tid
-
-        window_trip = self.window_trips.get(tid, [])
-        point_window_id = window_trip.index(point)
-
-        # last check shouldn't count
-        if point_window_id == 0 and (tid not in self.trips  or len(self.trips[tid])==0):
-            previous = None
-        elif point_window_id == 0:
-            previous = self.trips[tid][-1]
-        else:
-            previous = window_trip[point_window_id - 1]
-
-        if point_window_id == len(window_trip) - 1:
-            next = self.last_points[tid]
-        else:
-            next = window_trip[point_window_id + 1]
-        return previous, next
-
     def remove_point(self):
         """Remove point with least priority and update its neighboors' priorities."""
-        to_remove = self.priority_list.pop(0)
+        to_remove = self.priority_list.pop_min()
         tid = to_remove.tid
-
         trip = self.window_trips[tid]
 
-        to_remove_index = trip.index(to_remove)
-        del trip[to_remove_index]
+        # only the neighboors inside the window are updated
+        previous = to_remove.prev if to_remove is not trip.head else None
+        following = to_remove.next if to_remove is not trip.tail else None
+        trip.remove(to_remove)
 
         # update priority of the neighboors
-        if to_remove_index > 0:
-            previous = trip[to_remove_index - 1]
-            before_previous, after_previous = self.find_neighboors(previous)
-            if before_previous is not None:
-                self.priority_list.remove(previous)
-                previous.priority = compute_SED(
-                    before_previous.point,
-                    previous.point,
-                    after_previous.point,
-                    self.nys,
-                )
-                self.priority_list.add(previous)
-
-        if to_remove_index < len(trip):
-            following = trip[to_remove_index]
-            self.priority_list.remove(following)
-            before_following, after_following = self.find_neighboors(following)
-            following.priority = compute_SED(
-                before_following.point, following.point, after_following.point, self.nys
-            )
-            self.priority_list.add(following)
+        if previous is not None and previous.prev is not None:
+            self.priority_list.update(previous, self.evaluate_point(previous))
+
+        if following is not None:
+            self.priority_list.update(following, self.evaluate_point(following))
 
         # if this case is true, the two preceding couldn't
-        if to_remove_index == 0 and len(self.trips.get(tid, []) + trip) == 0:
+        if len(trip) == 0 and not self.trips.get(tid):
             # we were obliged to remove the only point of a trajectory (before last)
             if tid in self.last_points:
-                new = self.last_points[tid]
-                del self.last_points[tid]
+                new = self.last_points.pop(tid)
                 new.priority = float("inf")
-                trip.append(new)
+                self.append_point(new)
                 self.priority_list.add(new)
 
-    def compress(self):
-        """Compress all the points (in different time windows).
-
-        We need to redefine because of the last time in finalize trips.
-        """
-        start = self.instants.iloc[0].point.timestamp()
-        window_end = start + self.window
-        for _, row in self.instants.iterrows():
-            time = row.point.timestamp()
-            if time > window_end:
-                window_end = window_end + self.window
-                self.next_window(time)
-            self.add_point(PriorityPoint(row))
-
-        # keep points of last window
-        last_time = max([x.timestamp() for x in self.instants.point])
-        self.next_window(last_time)
-        self.finalize_trips_last_time(last_time)
-
-    def finalize_trips_last_time(self, last_time):
+    def evaluate_point(self, point):
+        """Compute the SED of point, its successor can be the buffered last point."""
+        if point.prev is None or point.next is None:
+            return float("inf")
+        return compute_SED_points(point.prev, point, point.next, self.distance)
+
+    def flush(self, time):
+        """Keep the buffered last points at the end of the compression."""
+        kept = {}
         for tid, point in self.last_points.items():
             self.trips.setdefault(tid, []).append(point)
-            self.delays.append(
-                (last_time - point.point.timestamp()).total_seconds()
-            )
+            self.record_delay((time - point.t) / 1e9)
+            kept[tid] = [point]
+        self.last_points = {}
+        self.emit(time, kept)
 
-        return super().finalize_trips()
+    def evict_trip(self, tid, time):
+        """Keep the buffered last point of the idle trip before dropping its state."""
+        point = self.last_points.pop(tid, None)
+        if point is not None:
+            self.trips.setdefault(tid, []).append(point)
+            self.record_delay((time - point.t) / 1e9)
+            self.emit(time, {tid: [point]})
+        super().evict_trip(tid, time)
@@ -0,0 +1,217 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.bwc.runner import create_compressor, fan_out
+from src.helpers.columns import PointColumns
+from src.helpers.distance import HAVERSINE
+from src.helpers.shared_arrays import SharedArrays, attach
+from src.helpers.utility import timedelta_ns, trip_distances
+
+# (shm, arrays, PointColumns, options) of the worker processes, set by the pool initializer
+store = None
+
+
+def sweep_cells(config, test_name):
+    """(subtest, window length, NPOINTS) of the subtests of a test of bwc_tests_config.ini."""
+    test = config[test_name]
+    cells = []
+    for subtest in test["subtests"]:
+        section = config[subtest]
+        unit = section.get("WINDOW_SIZE_UNIT", test.get("WINDOW_SIZE_UNIT"))
+        window_length = timedelta(**{unit: section.as_int("WINDOW_SIZE")})
+        cells.append((subtest, window_length, section.as_int("NPOINTS")))
+    return cells
+
+
+def point_store(columns):
+    """Arrays of the shared store: the time ordered columns, and their rows sorted by trip."""
+    order = np.argsort(columns.tid, kind="stable")
+    trip_ids, starts = np.unique(columns.tid[order], return_index=True)
+    arrays = {"tid": columns.tid, "t": columns.t, "x": columns.x, "y": columns.y}
+    if columns.sog is not None:
+        arrays.update(sog=columns.sog, cog=columns.cog)
+    arrays.update(order=order, trip_ids=trip_ids, trip_starts=np.append(starts, len(order)))
+    return arrays
+
+
+def original_trip(arrays, i):
+    """(t, x, y) of the trip i of the store."""
+    rows = arrays["order"][arrays["trip_starts"][i] : arrays["trip_starts"][i + 1]]
+    return arrays["t"][rows], arrays["x"][rows], arrays["y"][rows]
+
+
+def run_sweep(
+    points,
+    algorithms,
+    cells,
+    nys,
+    eval_delta,
+    bwc_sttrace_delta,
+    workers=None,
+    cache=None,
+    distance=HAVERSINE,
+):
+    """
+    Compress and evaluate the points for every (algorithm, cell) on a process pool.
+
+    The points are copied once to a shared memory store, read in place by the
+    workers. Each cell compresses the points with an algorithm and a
+    (subtest, window length, limit) of sweep_cells, then evaluates the kept
+    points against the original trips like assess_algorithms (the _Imp
+    variants buffer the received points). With a ResultCache, only the cells
+    missing from it are computed. distance is the distance backend of the
+    compressors and of the evaluation. Return the results of each
+    (subtest, algorithm) and the mean delays (algorithms x subtests).
+    """
+    cell_arrays, pending = {}, []
+    for subtest, window_length, limit in cells:
+        for algorithm in algorithms:
+            if cache is not None:
+                key = cache.key(
+                    algorithm, window_length, limit, eval_delta, bwc_sttrace_delta, nys, distance
+                )
+                cell_arrays[subtest, algorithm] = cache.load(key[0])
+            if cell_arrays.get((subtest, algorithm)) is None:
+                pending.append((algorithm, subtest, window_length, limit))
+
+    if pending:
+        if not isinstance(points, PointColumns):
+            points = PointColumns.from_dataframe(points)
+        options = dict(
+            nys=nys, eval_delta=eval_delta, bwc_sttrace_delta=bwc_sttrace_delta, distance=distance
+        )
+        with SharedArrays(point_store(points)) as shared_store, ProcessPoolExecutor(
+            workers or os.cpu_count(),
+            initializer=attach_store,
+            initargs=(shared_store.descriptor, points.srid, options),
+        ) as pool:
+            futures = {pool.submit(run_cell, *cell): cell for cell in pending}
+            for future in as_completed(futures):
+                algorithm, subtest, window_length, limit = futures[future]
+                cell_arrays[subtest, algorithm] = future.result()
+                if cache is not None:
+                    key = cache.key(
+                        algorithm, window_length, limit, eval_delta, bwc_sttrace_delta, nys, distance
+                    )
+                    cache.store(*key, cell_arrays[subtest, algorithm])
+
+    subtests = [cell[0] for cell in cells]
+    results = pd.concat(
+        {subtest: subtest_results(cell_arrays, subtest, algorithms) for subtest in subtests}
+    )
+    delays = pd.Series(
+        {cell: np.mean(arrays["delays"]) for cell, arrays in cell_arrays.items()}
+    )
+    delays = delays.unstack(0).reindex(index=algorithms, columns=subtests)
+    return results, delays
+
+
+def subtest_results(cell_arrays, subtest, algorithms):
+    """Results of the algorithms of a subtest, on the trips kept by all of them.
+
+    As in assess_algorithms, one trip out of ten is not evaluated. #kept is the
+    number of kept points, before the MEOS normalization of the sequences
+    (which drops the points of straight constant speed segments), as counted
+    by assess_compression.
+    """
+    trips = []
+    for algorithm in algorithms:
+        arrays = cell_arrays[subtest, algorithm]
+        stats = zip(
+            arrays["kept"].tolist(),
+            arrays["error_sum"],
+            arrays["evaluated"].tolist(),
+            arrays["max_error"],
+        )
+        trips.append(dict(zip(arrays["trip_ids"].tolist(), stats)))
+    common = sorted(set.intersection(*(set(kept) for kept in trips)))
+    evaluated = [tid for i, tid in enumerate(common) if i % 10 != 0]
+
+    rows = {}
+    for algorithm, kept in zip(algorithms, trips):
+        maxima = [kept[tid][3] for tid in evaluated]
+        rows[algorithm] = [
+            sum(kept[tid][0] for tid in common),
+            sum(kept[tid][1] for tid in evaluated) / sum(kept[tid][2] for tid in evaluated),
+            sum(maxima) / len(maxima),
+            max(maxima),
+            np.median(maxima),
+        ]
+    columns = ["#kept", "avg_error", "avg_max", "max_max", "med_max"]
+    return pd.DataFrame.from_dict(rows, orient="index", columns=columns)
+
+
+def write_sweep(results, delays, folder="res/bwc_compression/"):
+    """Write the average errors (all.csv), the mean delays and all the results."""
+    os.makedirs(folder, exist_ok=True)
+    errors = results["avg_error"].unstack(0).reindex(
+        index=delays.index, columns=delays.columns
+    )
+    errors.to_csv(folder + "all.csv", mode="w")
+    delays.to_csv(folder + "delays.csv", mode="w")
+    results.to_csv(folder + "results.csv", mode="w")
+
+
+def attach_store(descriptor, srid, options):
+    global store
+    shm, arrays = attach(descriptor)
+    columns = PointColumns(
+        arrays["tid"], arrays["t"], arrays["x"], arrays["y"], arrays.get("sog"), arrays.get("cog"), srid
+    )
+    store = shm, arrays, columns, options
+
+
+def run_cell(algorithm, subtest, window_length, limit):
+    """
+    Compress and evaluate a cell.
+
+    Return its arrays: the kept points (tid, t, x, y), the delays, and for
+    each evaluated trip the number of kept points, the sum, number and max
+    of the distances.
+    """
+    _, arrays, columns, options = store
+    distance = options["distance"]
+    compressor = create_compressor(
+        algorithm, window_length, limit, options["nys"], options["bwc_sttrace_delta"], distance=distance
+    )
+    fan_out(columns, [compressor])
+    compressor.close()
+
+    kept_trips = compressor.all_trips()
+    points = [point for kept in kept_trips.values() for point in kept]
+    delta = timedelta_ns(options["eval_delta"])
+    trips = []
+    for i, tid in enumerate(arrays["trip_ids"].tolist()):
+        original = original_trip(arrays, i)
+        if not kept_trips.get(tid) or len(original[0]) <= 1:
+            # the trips without kept points are skipped (trips_dataframe) and
+            # the trips of a single point are not evaluated (convert_points_trips)
+            continue
+        kept = kept_trips[tid]
+        compressed = (
+            np.array([point.t for point in kept], dtype=np.int64),
+            np.array([point.x for point in kept], dtype=np.float64),
+            np.array([point.y for point in kept], dtype=np.float64),
+        )
+        (distances,) = trip_distances(original, [compressed], delta, distance=distance)
+        trips.append(
+            (tid, len(kept), distances.sum(), len(distances), distances.max() if len(distances) else 0)
+        )
+
+    trip_ids, kept, error_sum, evaluated, max_error = zip(*trips) if trips else ([],) * 5
+    return {
+        "tid": np.array([point.tid for point in points], dtype=arrays["tid"].dtype),
+        "t": np.array([point.t for point in points], dtype=np.int64),
+        "x": np.array([point.x for point in points], dtype=np.float64),
+        "y": np.array([point.y for point in points], dtype=np.float64),
+        "delays": np.array(compressor.delays, dtype=np.float64),
+        "trip_ids": np.array(trip_ids, dtype=arrays["tid"].dtype),
+        "kept": np.array(kept, dtype=np.int64),
+        "error_sum": np.array(error_sum, dtype=np.float64),
+        "evaluated": np.array(evaluated, dtype=np.int64),
+        "max_error": np.array(max_error, dtype=np.float64),
+    }
@@ -1,77 +1,256 @@
 from abc import abstractmethod
-from sortedcontainers import SortedList
+from collections import OrderedDict, deque
+import numpy as np
 import pandas as pd
-from pymeos import TGeomPointSeq
-from src.helpers.utility import PriorityPoint
+from src.helpers.utility import LazyTrajectory, PriorityPoint, timedelta_ns
+from src.helpers.columns import PointColumns
+from src.helpers.distance import HAVERSINE
+from src.helpers.linked_trip import LinkedTrip
+from src.helpers.priority_queue import PriorityQueue
 
 
 class Windowed:
-    def __init__(self, points, window_lenght, limit, nys):
-        self.instants = points  # dataframe of points (can be with SOG, COG)
+    tail_length = 1  # kept points before the window needed to evaluate the window points
+    projected = False  # whether the points need their projected coordinates (px, py)
+
+    def __init__(
+        self,
+        points,
+        window_lenght,
+        limit,
+        nys,
+        on_window=None,
+        sink=None,
+        idle_ttl=None,
+        max_trips=None,
+        distance=None,
+    ):
+        self.instants = points  # dataframe or PointColumns of points (can be with SOG, COG), None if streamed
         self.window = window_lenght
+        self.window_ns = timedelta_ns(window_lenght)
         self.limit = limit
         self.nys = nys
+        self.distance = distance or HAVERSINE  # distance backend of the priorities
+        if self.distance.projected:
+            # the distances are computed on the coordinates projected by the backend
+            self.projected = True
+            self.nys = self.distance.nys
         self.trips = {}  # trips # the points kept in the trips before the window
         # window related attributes
-        self.window_trips = {}  # could be lists sorted by time !
-        self.priority_list = SortedList(key=lambda x: x.priority)  # priorities!
+        self.window_trips = {}  # LinkedTrip of the points in the window
+        self.priority_list = PriorityQueue()  # priorities!
         self.delays = []
+        self.delay_count, self.delay_total, self.delay_max = 0, 0.0, 0.0
+        # streaming related attributes
+        self.on_window = on_window  # called with (time, {tid: kept points}) when a window is closed
+        self.sink = sink  # same as on_window, but only the tail of the trips is kept in memory
+        self.window_end = None
+        self.last_time = None
+        # eviction of the idle trajectories (checked when a window is closed)
+        self.idle_ttl_ns = None if idle_ttl is None else timedelta_ns(idle_ttl)
+        self.max_trips = max_trips  # LRU bound on the number of trajectories in memory
+        self.evicting = idle_ttl is not None or max_trips is not None
+        self.last_seen = OrderedDict()  # tid -> last reception time, oldest first (if evicting)
+        self.evicted_trips = {}  # kept points of evicted trips, if there is no sink
 
     def compress(self):
         """Compress all the points (in different time windows)."""
-        start = self.instants.iloc[0].point.timestamp()
-        window_end = start + self.window
-        for _, row in self.instants.iterrows():
-            time = row.point.timestamp()
-            if time > window_end:
-                window_end = window_end + self.window
-                self.next_window(time)
-            self.add_point(PriorityPoint(row))
-
-        # keep points of last window
-        last_time = max([x.timestamp() for x in self.instants.point])
-        self.next_window(last_time)
-        self.finalize_trips()
+        self.push_many(self.instants)
+        self.close()
+        if self.sink is None:
+            self.finalize_trips()
+
+    def push(self, point):
+        """Add a PriorityPoint received in time order."""
+        if self.projected and point.px is None:
+            # not projected at ingestion (single pushed point or dataframe row)
+            point.px, point.py = self.nys(point.x, point.y)
+        self.advance(point.t)
+        self.add_point(point)
+        if self.evicting:
+            self.last_seen[point.tid] = point.t
+            self.last_seen.move_to_end(point.tid)
+        if self.last_time is None or point.t > self.last_time:
+            self.last_time = point.t
+
+    def push_many(self, batch):
+        """Add a batch of points (PointColumns, dataframe or iterable of PriorityPoints)."""
+        for point in priority_points(batch, self.nys if self.projected else None):
+            self.push(point)
+
+    def advance(self, time):
+        """Close the current window if time (epoch ns) is after its end."""
+        if self.window_end is None:
+            self.window_end = time + self.window_ns
+        elif time > self.window_end:
+            self.window_end = self.window_end + self.window_ns
+            self.next_window(time)
+
+    def close(self):
+        """End of the stream: keep the points of the last window."""
+        self.next_window(self.last_time)
+        self.flush(self.last_time)
+
+    def stream(self, batch, close=True):
+        """Push the points and yield (time, {tid: kept points}) as soon as a window is closed."""
+        closed = deque()
+        callback = self.on_window
+
+        def collect(time, kept):
+            if callback is not None:
+                callback(time, kept)
+            closed.append((time, kept))
+
+        self.on_window = collect
+        try:
+            for point in priority_points(batch, self.nys if self.projected else None):
+                self.push(point)
+                while closed:
+                    yield closed.popleft()
+            if close:
+                self.close()
+                while closed:
+                    yield closed.popleft()
+        finally:
+            self.on_window = callback
+
+    def emit(self, time, kept):
+        """Hand the points kept when closing a window to the on_window callback and sink."""
+        if not kept:
+            return
+        if self.on_window is not None:
+            self.on_window(time, kept)
+        if self.sink is not None:
+            self.sink(time, kept)
+            for tid in kept:
+                self.trim_trip(tid)
+
+    def trim_trip(self, tid):
+        """Forget the kept points of the trip that the algorithm will not read anymore."""
+        trip = self.trips[tid]
+        if len(trip) > self.tail_length:
+            del trip[: -self.tail_length]
+            trip[0].prev = None
+
+    def flush(self, time):
+        """Keep the points still buffered at the end (none by default)."""
+        pass
 
     @abstractmethod
     def add_point(self, point):
         pass
 
+    def last_kept(self, tid):
+        """Return the last point of the trajectory (in the window or before)."""
+        trip = self.window_trips.get(tid)
+        if trip:
+            return trip.tail
+        kept = self.trips.get(tid)
+        return kept[-1] if kept else None
+
+    def append_point(self, point):
+        """Add point at the end of its trajectory in the window."""
+        kept = self.trips.get(point.tid)
+        trip = self.window_trips.setdefault(point.tid, LinkedTrip())
+        trip.append(point, kept[-1] if kept else None)
+        return trip
+
     def next_window(self, time):
         """Empty the priorityQueue to the kept points."""
         self.compute_delays(time)
-        added = 0
-        for trip in self.window_trips:
-            self.trips.setdefault(trip, []).extend(self.window_trips[trip])
-            added += len(self.window_trips[trip])
+        kept = {}
+        for tid, trip in self.window_trips.items():
+            points = list(trip)
+            self.trips.setdefault(tid, []).extend(points)
+            if points:
+                kept[tid] = points
 
-        self.priority_list = SortedList(key=lambda x: x.priority)  # priorities!
-        self.window_trips = {}  # could be lists sorted by time !
+        self.priority_list.clear()
+        self.window_trips = {}
         # the priorities buffered at the end are valid for next window start
+        self.emit(time, kept)
+        if time is not None:
+            self.evict_idle_trips(time)
+
+    def evict_idle_trips(self, time):
+        """Evict the trips idle for longer than idle_ttl, then the least recent above max_trips."""
+        while self.last_seen:
+            tid, seen = next(iter(self.last_seen.items()))
+            idle = self.idle_ttl_ns is not None and seen < time - self.idle_ttl_ns
+            if idle or (self.max_trips is not None and len(self.last_seen) > self.max_trips):
+                self.evict_trip(tid, time)
+            else:
+                break
+
+    def evict_trip(self, tid, time):
+        """Drop the state of a trip (its window is empty), its kept points stay in the output."""
+        self.last_seen.pop(tid, None)
+        self.window_trips.pop(tid, None)
+        kept = self.trips.pop(tid, [])
+        if self.sink is None and kept:
+            self.evicted_trips.setdefault(tid, []).extend(kept)
+
+    def all_trips(self):
+        """Kept points of all the trips, including the evicted ones."""
+        trips = dict(self.trips)
+        for tid, points in self.evicted_trips.items():
+            trips[tid] = points + trips.get(tid, [])
+        return trips
 
     def compute_delays(self, time):
         """Compute the delay between the reception and validation of the point."""
         for point in self.priority_list:
-            self.delays.append((time - point.point.timestamp()).total_seconds())
+            self.record_delay((time - point.t) / 1e9)
+
+    def record_delay(self, delay):
+        """Store the delay (s), only summarized when the kept points go to a sink."""
+        if self.sink is None:
+            self.delays.append(delay)
+        self.delay_count += 1
+        self.delay_total += delay
+        self.delay_max = max(self.delay_max, delay)
+
+    def mean_delay(self):
+        return self.delay_total / self.delay_count if self.delay_count else 0.0
 
     def finalize_trips(self):
-        """Build TGeomPoint sequences from the kept points."""
+        """Build the (lazy) trajectories of the kept points."""
+        self.trips = trips_dataframe(self.all_trips())
         # check for errors -> shouldn't be
-        for key, points in self.trips.items():
-            i = 0
-            flag = False
-            for i in range(len(points) - 1):
-                if points[i].point.timestamp() >= points[i + 1].point.timestamp():
-                    flag = True
-            if flag or len(points) == 0:
-                print(key, points)
-                print("Above")
-        # traj is a list of PriorityPoints
-        trips_dico = {
-            key: TGeomPointSeq.from_instants([x.point for x in traj], upper_inc=True)
-            for key, traj in self.trips.items()
-        }
-
-        self.trips = pd.DataFrame.from_dict(
-            trips_dico, orient="index", columns=["trajectory"]
-        )
+        for key in unordered_trips(self.trips):
+            print(key, self.trips.loc[key, "trajectory"].arrays[0])
+            print("Above")
+
+    def compressed_trips(self):
+        """Dataframe of the compressed trajectories, once finalized."""
+        return self.trips
+
+
+def trips_dataframe(trips):
+    """Dataframe (trajectory column) of the LazyTrajectory of the kept points of each trip.
+
+    The trips without any kept point are skipped.
+    """
+    trajectories = {key: LazyTrajectory.from_points(traj) for key, traj in trips.items() if traj}
+    return pd.DataFrame.from_dict(trajectories, orient="index", columns=["trajectory"])
+
+
+def unordered_trips(trips):
+    """Ids of the trips (dataframe of LazyTrajectory) whose times are not strictly increasing."""
+    return [
+        key
+        for key, trajectory in trips["trajectory"].items()
+        if (np.diff(trajectory.arrays[0]) <= 0).any()
+    ]
+
+
+def priority_points(points, nys=None):
+    """Iterate over points (PointColumns, dataframe or PriorityPoints) as PriorityPoints.
+
+    The columns are projected in batch with nys if given.
+    """
+    if isinstance(points, PointColumns):
+        return points.priority_points(nys)
+    if isinstance(points, pd.DataFrame):
+        return (PriorityPoint(row) for _, row in points.iterrows())
+    return points
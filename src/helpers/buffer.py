@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class TrajectoryBuffer:
+    """
+    Raw (t, x, y) points received for a trajectory, in time order.
+
+    Points are appended at the end and discarded from the start. Instead of
+    wrapping around like a ring buffer, the live points are moved back to the
+    start of the arrays when space is needed, so that arrays() always returns
+    contiguous views usable by np.interp.
+    """
+
+    def __init__(self, capacity=32):
+        self.t = np.empty(capacity, dtype=np.int64)
+        self.x = np.empty(capacity, dtype=np.float64)
+        self.y = np.empty(capacity, dtype=np.float64)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def append(self, t, x, y):
+        if self.end == len(self.t):
+            self.make_room()
+        self.t[self.end], self.x[self.end], self.y[self.end] = t, x, y
+        self.end += 1
+
+    def discard_before(self, t):
+        """Forget the points received strictly before t."""
+        self.start += int(np.searchsorted(self.t[self.start : self.end], t, side="left"))
+
+    def arrays(self):
+        """(t, x, y) views of the buffered points."""
+        live = slice(self.start, self.end)
+        return self.t[live], self.x[live], self.y[live]
+
+    def make_room(self):
+        """Compact the live points, and double the capacity if more than half full."""
+        size = len(self)
+        capacity = len(self.t) * 2 if size > len(self.t) // 2 else len(self.t)
+        for name in ("t", "x", "y"):
+            column = getattr(self, name)
+            compacted = np.empty(capacity, dtype=column.dtype)
+            compacted[:size] = column[self.start : self.end]
+            setattr(self, name, compacted)
+        self.start, self.end = 0, size
@@ -0,0 +1,139 @@
+import re
+
+import numpy as np
+
+from src.helpers.utility import PriorityPoint
+
+# text of a MEOS point instant: [SRID=4326;]POINT(x y)@2021-01-01 00:00:00+00
+POINT_PATTERN = re.compile(
+    r"^[ \t]*(?:SRID=(\d+);)?[ \t]*POINT[ \t]*\([ \t]*([^\s()]+)[ \t]+([^\s()]+)[ \t]*\)"
+    r"[ \t]*@[ \t]*(\d{4}-\d\d-\d\d[ T][\d:.]+)(Z|[+-][\d:]+)?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+class PointColumns:
+    """
+    Time ordered points stored as contiguous NumPy columns.
+
+    tid, t (int64 epoch nanoseconds), x and y (float64) and optionally sog and
+    cog. The compressors can consume them without any pandas or MEOS object
+    per row, the TGeomPointInst of a kept point is only built for the output.
+    """
+
+    def __init__(self, tid, t, x, y, sog=None, cog=None, srid=4326):
+        tid = np.asarray(tid)
+        if tid.dtype.hasobject:
+            # python ids (e.g. str) to a fixed width dtype: shareable and saved without pickle
+            tid = np.array(tid.tolist())
+        self.tid = np.ascontiguousarray(tid)
+        self.t = np.ascontiguousarray(t, dtype=np.int64)
+        self.x = np.ascontiguousarray(x, dtype=np.float64)
+        self.y = np.ascontiguousarray(y, dtype=np.float64)
+        self.sog = None if sog is None else np.ascontiguousarray(sog, dtype=np.float64)
+        self.cog = None if cog is None else np.ascontiguousarray(cog, dtype=np.float64)
+        self.srid = srid
+        self.projection = None  # (nys, px, py) of the last projection
+
+    def __len__(self):
+        return len(self.t)
+
+    @classmethod
+    def from_dataframe(cls, points, srid=4326):
+        """Extract the columns of a dataframe of points (id, point, [sog, cog])."""
+        values = [point.value() for point in points["point"]]
+        has_sog = "sog" in points.columns
+        return cls(
+            tid=points["id"].to_numpy(),
+            t=instant_times(points["point"]),
+            x=[value.x for value in values],
+            y=[value.y for value in values],
+            sog=points["sog"].to_numpy() if has_sog else None,
+            cog=points["cog"].to_numpy() if has_sog else None,
+            srid=srid,
+        )
+
+    @classmethod
+    def from_text(cls, tid, points, sog=None, cog=None, srid=4326):
+        """Columns of points given as MEOS texts (see parse_points)."""
+        t, x, y, srid = parse_points(points, srid)
+        return cls(tid, t, x, y, sog, cog, srid)
+
+    def take(self, rows):
+        """PointColumns of the given rows (indices or boolean mask)."""
+        optional = (None if column is None else column[rows] for column in (self.sog, self.cog))
+        return PointColumns(
+            self.tid[rows], self.t[rows], self.x[rows], self.y[rows], *optional, srid=self.srid
+        )
+
+    def project(self, nys):
+        """Projected coordinates of all the points, in a single vectorized call."""
+        if self.projection is None or self.projection[0] is not nys:
+            px, py = nys(self.x, self.y)
+            self.projection = (nys, np.asarray(px), np.asarray(py))
+        return self.projection[1], self.projection[2]
+
+    def rows(self, nys=None):
+        """Iterate over the (tid, t, x, y, sog, cog, px, py) of the points as Python values."""
+        n = len(self)
+        sog = self.sog.tolist() if self.sog is not None else [None] * n
+        cog = self.cog.tolist() if self.cog is not None else [None] * n
+        if nys is not None:
+            px, py = (column.tolist() for column in self.project(nys))
+        else:
+            px = py = [None] * n
+        return zip(self.tid.tolist(), self.t.tolist(), self.x.tolist(), self.y.tolist(), sog, cog, px, py)
+
+    def priority_points(self, nys=None):
+        """Iterate over the points as PriorityPoints (projected with nys if given)."""
+        srid = self.srid
+        from_values = PriorityPoint.from_values
+        for tid, t, x, y, sog, cog, px, py in self.rows(nys):
+            yield from_values(tid, t, x, y, sog, cog, srid, px, py)
+
+
+def parse_points(points, srid=4326):
+    """(t, x, y, srid) of MEOS point instants texts, parsed for the whole column at once.
+
+    The texts are joined and matched by a single regex scan, the numbers and
+    timestamps are then converted by NumPy. t is in epoch nanoseconds, srid
+    is the one of the texts (all the same) or the given default if they have none.
+    """
+    texts = [str(point) for point in points]
+    matches = POINT_PATTERN.findall("\n".join(texts))
+    if len(matches) != len(texts):
+        invalid = [text for text in texts if not POINT_PATTERN.fullmatch(text)]
+        raise ValueError(f"{len(invalid)} points cannot be parsed, e.g. {invalid[0]!r}")
+    if not matches:
+        return np.empty(0, np.int64), np.empty(0), np.empty(0), srid
+
+    srids, x, y, times, offsets = zip(*matches)
+    srids = set(srids) - {""}
+    if len(srids) > 1:
+        raise ValueError(f"points with different SRIDs: {sorted(srids)}")
+    if srids:
+        srid = int(srids.pop())
+    offset_table = {offset: offset_ns(offset) for offset in set(offsets)}
+    t = np.array(times, dtype="datetime64[ns]").astype(np.int64)
+    t -= np.array([offset_table[offset] for offset in offsets], dtype=np.int64)
+    return t, np.array(x, dtype=np.float64), np.array(y, dtype=np.float64), srid
+
+
+def offset_ns(offset):
+    """UTC offset (+01, -05:30, Z, ...) in nanoseconds, no offset is UTC."""
+    if offset in ("", "Z", "z"):
+        return 0
+    digits = offset[1:].replace(":", "")
+    seconds = int(digits[:2]) * 3600 + int(digits[2:4] or 0) * 60
+    return (-seconds if offset[0] == "-" else seconds) * 10**9
+
+
+def instant_times(instants):
+    """Epoch ns of TGeomPointInsts, read from their MEOS texts.
+
+    Much faster than timestamp(), which builds a datetime per instant. Only
+    the times are taken from the texts, MEOS does not print the coordinates
+    with all their digits.
+    """
+    return parse_points([instant.as_ewkt() for instant in instants])[0]
+
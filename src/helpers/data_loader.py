@@ -2,7 +2,10 @@ import pandas as pd
 from tqdm import tqdm
 tqdm.pandas()
 import os
+import json
+import numpy as np
 from pymeos import TGeomPointInst
+from src.helpers.columns import PointColumns
 
 RAW = "data/raw/"
 PREPROCESSED = "data/preprocessed/"
@@ -20,6 +23,48 @@ def load_csv_to_df(dataset, columns, names_transform=None, preprocessed=True):
     return instants
 
 
+def load_csv_columns(dataset, columns, names_transform=None, preprocessed=True, srid=4326):
+    """Same points as load_csv_to_df, as PointColumns parsed without any MEOS object."""
+    instants = pd.read_csv(filename(dataset, preprocessed), header=0, usecols=columns)
+    if names_transform is not None:
+        instants = instants.rename(names_transform, axis=1)
+    return text_columns(instants.dropna(), srid)
+
+
+def text_columns(instants, srid=4326):
+    """PointColumns of a dataframe whose point column holds the MEOS texts."""
+    has_sog = "sog" in instants.columns
+    return PointColumns.from_text(
+        instants["id"].to_numpy(),
+        instants["point"].to_numpy(),
+        sog=instants["sog"].to_numpy() if has_sog else None,
+        cog=instants["cog"].to_numpy() if has_sog else None,
+        srid=srid,
+    )
+
+
+def read_csv_chunks(dataset, columns, chunk_size=100_000, names_transform=None, preprocessed=True, srid=4326):
+    """Yield the points of the csv as time ordered PointColumns of at most chunk_size rows.
+
+    Only one chunk is in memory at a time, the batches can be pushed to the
+    compressors (push_many) as they are read. The rows of a chunk are sorted
+    by time but the file must be ordered across chunks.
+    """
+    end = None
+    for chunk in pd.read_csv(filename(dataset, preprocessed), header=0, usecols=columns, chunksize=chunk_size):
+        if names_transform is not None:
+            chunk = chunk.rename(names_transform, axis=1)
+        chunk = chunk.dropna()
+        if len(chunk) == 0:
+            continue
+        batch = text_columns(chunk, srid)
+        batch = batch.take(np.argsort(batch.t, kind="stable"))
+        if end is not None and batch.t[0] < end:
+            raise ValueError(f"{dataset}: the points are not ordered by time across chunks")
+        end = batch.t[-1]
+        yield batch
+
+
 def filename(dataset, preprocessed) -> str:
     if preprocessed:
         folder = PREPROCESSED + dataset + "/"
@@ -33,3 +78,41 @@ def filename(dataset, preprocessed) -> str:
 def save_df_to_csv(dataset_name, df, preprocessed=True):
     out_fname = filename(dataset_name, preprocessed)
     df.to_csv(out_fname)
+
+
+COLUMNS = ("tid", "t", "x", "y", "sog", "cog")
+
+
+def columns_folder(dataset) -> str:
+    return PREPROCESSED + dataset + "/columns/"
+
+
+def save_columns(dataset, points, srid=4326):
+    """Write the points (dataframe or PointColumns) as .npy columns next to points.csv."""
+    if not isinstance(points, PointColumns):
+        points = PointColumns.from_dataframe(points, srid)
+    folder = columns_folder(dataset)
+    os.makedirs(folder, exist_ok=True)
+    arrays = dict(tid=points.tid, t=points.t, x=points.x, y=points.y, sog=points.sog, cog=points.cog)
+    for name, array in arrays.items():
+        if array is not None:
+            np.save(folder + name + ".npy", array)
+    with open(folder + "meta.json", "w") as f:
+        json.dump({"srid": points.srid, "columns": [n for n in COLUMNS if arrays[n] is not None]}, f)
+
+
+def load_columns(dataset, mmap_mode="r"):
+    """PointColumns of a preprocessed dataset, memory-mapped from the files of save_columns.
+
+    The processes loading the same dataset share the pages of the files.
+    """
+    folder = columns_folder(dataset)
+    with open(folder + "meta.json") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(folder + name + ".npy", mmap_mode=mmap_mode) for name in meta["columns"]}
+    return PointColumns(srid=meta["srid"], **arrays)
+
+
+def has_columns(dataset) -> bool:
+    return os.path.exists(columns_folder(dataset) + "meta.json")
+
@@ -0,0 +1,157 @@
+"""
+Distances (m) between lon/lat points, with interchangeable backends.
+
+A backend is selected once per run and shared by the compressors (SED of
+PriorityPoints) and the evaluation (distances between arrays):
+
+- HAVERSINE: great circle distance on the mean earth sphere, the reference.
+- Equirectangular: flat earth approximation, no inverse trigonometry.
+- Planar: euclidean distance between projected coordinates, the compressors
+  then use the px, py of the points, projected once at ingestion.
+"""
+from functools import lru_cache
+import math
+
+import numpy as np
+from pyproj import Proj
+
+EARTH_RADIUS = 6371008.8  # mean earth radius in meters (same as haversine)
+METERS_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+
+
+@lru_cache(maxsize=None)
+def projection(crs):
+    """The Proj of a crs, created once."""
+    return Proj(crs)
+
+
+def haversine_distance(x1, y1, x2, y2):
+    """Haversine distance (m) between two lon/lat points, scalar fast path."""
+    x1, y1, x2, y2 = map(math.radians, (x1, y1, x2, y2))
+    d = (
+        math.sin((y2 - y1) * 0.5) ** 2
+        + math.cos(y1) * math.cos(y2) * math.sin((x2 - x1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(d))
+
+
+def haversine_distances(x1, y1, x2, y2):
+    """Haversine distances (m) between lon/lat arrays."""
+    x1, y1, x2, y2 = map(np.radians, (x1, y1, x2, y2))
+    d = (
+        np.sin((y2 - y1) * 0.5) ** 2
+        + np.cos(y1) * np.cos(y2) * np.sin((x2 - x1) * 0.5) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(d))
+
+
+class Haversine:
+    """Great circle distance on the mean earth sphere (as the haversine package)."""
+
+    name = "haversine"
+    projected = False  # whether sed needs the projected coordinates (px, py) of the points
+
+    def distance(self, x1, y1, x2, y2):
+        """Distance (m) between two lon/lat points."""
+        return haversine_distance(x1, y1, x2, y2)
+
+    def distances(self, x1, y1, x2, y2):
+        """Distances (m) between lon/lat arrays."""
+        return haversine_distances(x1, y1, x2, y2)
+
+    def sed(self, a, b, c):
+        """Synchronized distance of PriorityPoint b to the segment ac.
+
+        The synchronized point is linearly interpolated in lon/lat (as
+        TGeomPointSeq.value_at_timestamp) at the exact time of b.
+        """
+        if c.t == a.t:
+            return self.distance(b.x, b.y, a.x, a.y)
+        ratio = (b.t - a.t) / (c.t - a.t)
+        return self.distance(b.x, b.y, a.x + ratio * (c.x - a.x), a.y + ratio * (c.y - a.y))
+
+
+class Equirectangular(Haversine):
+    """
+    Flat earth approximation of the haversine distance.
+
+    The longitude difference is scaled by the cosine of the mean latitude of
+    the two points, or of a fixed lat0 (e.g. the center of the region) which
+    avoids any trigonometry per distance.
+
+    With the mean latitude the relative error to the haversine distance is
+    below 1e-4 for points less than 100 km apart at latitudes under 70
+    degrees (it grows with the square of the distance), i.e. under 1 cm for
+    the distances of a few hundred meters of the evaluation. With lat0 the
+    east-west component is off by |cos(lat) / cos(lat0) - 1|, about
+    tan(lat0) * |lat - lat0| (in radians): below 2% in the Oresund box
+    (55 to 56.5 N, lat0 = 55.75).
+    """
+
+    def __init__(self, lat0=None):
+        self.lat0 = lat0
+        self.scale = None if lat0 is None else math.cos(math.radians(lat0))
+        self.name = "equirectangular" if lat0 is None else f"equirectangular({lat0})"
+
+    def distance(self, x1, y1, x2, y2):
+        scale = self.scale
+        if scale is None:
+            scale = math.cos(math.radians((y1 + y2) * 0.5))
+        return METERS_PER_DEGREE * math.hypot((x2 - x1) * scale, y2 - y1)
+
+    def distances(self, x1, y1, x2, y2):
+        scale = self.scale
+        if scale is None:
+            scale = np.cos(np.radians((np.asarray(y1) + y2) * 0.5))
+        return METERS_PER_DEGREE * np.hypot((np.asarray(x2) - x1) * scale, np.asarray(y2) - y1)
+
+
+class Planar(Haversine):
+    """
+    Euclidean distance between projected coordinates.
+
+    nys is a Proj (or a crs) in meters. The lon/lat points are projected
+    before the distance; the SED uses the px, py of the points, interpolated
+    in the projected plane. The distances are on the ellipsoid of the
+    projection: they differ from the spherical haversine ones by up to 0.5%,
+    plus the scale error of the projection (for UTM, 0.04% on the central
+    meridian up to 0.1% at the edges of the zone).
+    """
+
+    projected = True
+
+    def __init__(self, nys):
+        self.nys = projection(nys) if isinstance(nys, str) else nys
+        self.name = f"planar({self.nys.crs.to_string()})"
+
+    def distance(self, x1, y1, x2, y2):
+        px1, py1 = self.nys(x1, y1)
+        px2, py2 = self.nys(x2, y2)
+        return math.hypot(px2 - px1, py2 - py1)
+
+    def distances(self, x1, y1, x2, y2):
+        px1, py1 = self.nys(np.asarray(x1), np.asarray(y1))
+        px2, py2 = self.nys(np.asarray(x2), np.asarray(y2))
+        return np.hypot(px2 - px1, py2 - py1)
+
+    def sed(self, a, b, c):
+        if c.t == a.t:
+            return math.hypot(b.px - a.px, b.py - a.py)
+        ratio = (b.t - a.t) / (c.t - a.t)
+        return math.hypot(
+            b.px - (a.px + ratio * (c.px - a.px)), b.py - (a.py + ratio * (c.py - a.py))
+        )
+
+
+HAVERSINE = Haversine()
+
+
+def distance_backend(name="haversine", nys=None, lat0=None):
+    """Backend of a name (haversine, equirectangular or planar), e.g. from a config file."""
+    if name == "haversine":
+        return HAVERSINE
+    if name == "equirectangular":
+        return Equirectangular(lat0)
+    if name == "planar":
+        return Planar(nys)
+    raise ValueError(f"unknown distance backend {name!r}")
@@ -0,0 +1,58 @@
+def link(previous, point):
+    """Make point the successor of previous (which can be None)."""
+    point.prev = previous
+    point.next = None
+    if previous is not None:
+        previous.next = point
+
+
+class LinkedTrip:
+    """
+    Doubly linked list of the PriorityPoints of a trajectory inside a window.
+
+    The links are stored on the points themselves (prev/next) and may point
+    outside of the window: the head is linked to the last kept point before
+    the window and, for the delayed variants, the tail to the buffered point.
+    """
+
+    def __init__(self):
+        self.head = None
+        self.tail = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        point = self.head
+        while point is not None:
+            yield point
+            if point is self.tail:
+                break
+            point = point.next
+
+    def append(self, point, previous=None):
+        """Add point at the end of the trip (after previous if the trip is empty)."""
+        if self.tail is not None:
+            previous = self.tail
+        link(previous, point)
+        if self.head is None:
+            self.head = point
+        self.tail = point
+        self.size += 1
+
+    def remove(self, point):
+        """Unlink point from the trip, its neighboors become linked together."""
+        previous, following = point.prev, point.next
+        if previous is not None:
+            previous.next = following
+        if following is not None:
+            following.prev = previous
+
+        is_head, is_tail = point is self.head, point is self.tail
+        if is_head:
+            self.head = None if is_tail else following
+        if is_tail:
+            self.tail = None if is_head else previous
+        point.prev = point.next = None
+        self.size -= 1
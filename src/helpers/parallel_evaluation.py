@@ -0,0 +1,94 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from src.helpers.distance import HAVERSINE
+from src.helpers.shared_arrays import SharedArrays, attach
+from src.helpers.utility import (
+    algorithm_scores,
+    timedelta_ns,
+    trajectory_arrays,
+    trip_distances,
+)
+
+# Arrays of the worker processes, set by the pool initializer.
+shared = None
+
+
+def pack_trajectories(trajectories):
+    """(t, x, y, offsets) concatenation of the arrays of the trajectories."""
+    arrays = [trajectory_arrays(trajectory) for trajectory in trajectories]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(t) for t, _, _ in arrays])
+    t = np.concatenate([a[0] for a in arrays]) if arrays else np.empty(0, np.int64)
+    x = np.concatenate([a[1] for a in arrays]) if arrays else np.empty(0)
+    y = np.concatenate([a[2] for a in arrays]) if arrays else np.empty(0)
+    return t, x, y, offsets
+
+
+def unpack_trajectory(arrays, column, i):
+    """(t, x, y) views of the trajectory i of a packed column."""
+    offsets = arrays[f"offsets{column}"]
+    trip = slice(offsets[i], offsets[i + 1])
+    return tuple(arrays[f"{name}{column}"][trip] for name in "txy")
+
+
+def attach_shared(descriptor):
+    global shared
+    shared = attach(descriptor)
+
+
+def evaluate_rows(start, stop, n_algorithms, delta, distance=HAVERSINE):
+    _, arrays = shared
+    distances = [[] for _ in range(n_algorithms)]
+    for i in range(start, stop):
+        original = unpack_trajectory(arrays, 0, i)
+        compressed = [unpack_trajectory(arrays, k + 1, i) for k in range(n_algorithms)]
+        for algorithm, trip in enumerate(trip_distances(original, compressed, delta, distance=distance)):
+            distances[algorithm].append(trip)
+    return distances
+
+
+def evaluate_algorithms_parallel(
+    trips, algorithms, original_column, precision, workers=None, distance=HAVERSINE
+):
+    """
+    Same as evaluate_algorithms, with the trips partitioned over a process pool.
+
+    The trajectories are converted once to (t, x, y) arrays, packed per column
+    (original first) in a shared memory block and read in place by the workers.
+    """
+    workers = workers or os.cpu_count()
+    delta = timedelta_ns(precision)
+    rows = np.arange(len(trips))
+    rows = rows[rows % 10 != 0]  # same trips as evaluate_algorithms
+
+    packed = {}
+    for column, name in enumerate([original_column] + list(algorithms)):
+        t, x, y, offsets = pack_trajectories(trips[name].to_numpy()[rows])
+        packed.update({f"t{column}": t, f"x{column}": x, f"y{column}": y})
+        packed[f"offsets{column}"] = offsets
+
+    bounds = np.linspace(0, len(rows), min(len(rows), 4 * workers) + 1).astype(int)
+    distances = {algorithm: [] for algorithm in algorithms}
+    with SharedArrays(packed) as arrays, ProcessPoolExecutor(
+        workers, initializer=attach_shared, initargs=(arrays.descriptor,)
+    ) as pool:
+        futures = [
+            pool.submit(evaluate_rows, start, stop, len(algorithms), delta, distance)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        for future in futures:
+            for algorithm, trips_distances in zip(algorithms, future.result()):
+                distances[algorithm].extend(trips_distances)
+    return distances
+
+
+def assess_algorithms_parallel(
+    trips, algorithms, original_column, precision, workers=None, distance=HAVERSINE
+):
+    """assess_algorithms using evaluate_algorithms_parallel."""
+    return algorithm_scores(
+        evaluate_algorithms_parallel(trips, algorithms, original_column, precision, workers, distance)
+    )
@@ -0,0 +1,70 @@
+import heapq
+from itertools import count
+
+
+class PriorityQueue:
+    """
+    Addressable min-priority queue of PriorityPoints.
+
+    Entries are (priority, seq, point) tuples kept in a binary heap. Updating a
+    point pushes a new entry and invalidates the previous one (lazy deletion):
+    a point only owns the entry whose seq is stored in point.heap_seq. Ties are
+    broken by insertion order, as with the SortedList used before.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.size = 0
+        self.counter = count()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """Iterate over the points in the queue (in no particular order)."""
+        for _, seq, point in self.heap:
+            if point.heap_seq == seq:
+                yield point
+
+    def add(self, point):
+        """Insert point with its current priority."""
+        seq = next(self.counter)
+        point.heap_seq = seq
+        heapq.heappush(self.heap, (point.priority, seq, point))
+        self.size += 1
+
+    def update(self, point, priority):
+        """Change the priority of a point already in the queue."""
+        point.priority = priority
+        seq = next(self.counter)
+        point.heap_seq = seq
+        heapq.heappush(self.heap, (priority, seq, point))
+        if len(self.heap) > 2 * self.size + 64:
+            self.compact()
+
+    def remove(self, point):
+        """Remove point from the queue."""
+        point.heap_seq = None
+        self.size -= 1
+
+    def pop_min(self):
+        """Remove and return the point with the lowest priority."""
+        heap = self.heap
+        while True:
+            _, seq, point = heapq.heappop(heap)
+            if point.heap_seq == seq:
+                point.heap_seq = None
+                self.size -= 1
+                return point
+
+    def clear(self):
+        """Remove all the points."""
+        for point in self:
+            point.heap_seq = None
+        self.heap = []
+        self.size = 0
+
+    def compact(self):
+        """Drop the outdated entries."""
+        self.heap = [entry for entry in self.heap if entry[2].heap_seq == entry[1]]
+        heapq.heapify(self.heap)
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+
+from src.helpers.utility import interpolate, sample_times, trajectory_arrays
+
+
+class ReferenceCache:
+    """
+    LRU cache of the original trajectories used for the evaluation.
+
+    It holds the (t, x, y) arrays of the original trips and their positions
+    sampled every eval_delta, keyed by (trip id, eval_delta, start, end) where
+    [start, end] is the sampled time range (from the start of the compressed
+    trajectory to the end of the original one). Algorithms and subtests
+    sharing the cache only pay once for sampling the ground truth. The least
+    recently used entries are dropped above max_bytes.
+    """
+
+    def __init__(self, max_bytes=512 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def reference(self, tid, trajectory):
+        """(t, x, y) arrays of the original trajectory."""
+        return self.get(("arrays", tid), lambda: trajectory_arrays(trajectory))
+
+    def samples(self, tid, reference, start, delta):
+        """(times, x, y) of the original sampled every delta after start."""
+        end = int(reference[0][-1])
+
+        def sample():
+            times = sample_times(start, end, delta)
+            return (times,) + interpolate(reference, times)
+
+        return self.get((tid, delta, start, end), sample)
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        self.nbytes += sum(array.nbytes for array in value)
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= sum(array.nbytes for array in evicted)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from src.helpers.distance import HAVERSINE
+from src.helpers.utility import timedelta_ns
+
+SOURCES = Path(__file__).resolve().parents[1]  # the src package
+
+
+def file_hash(fname, chunk_size=2**20):
+    """sha256 of the content of a file."""
+    digest = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def folder_hash(folder):
+    """sha256 of the names and contents of the files of a folder."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(folder).iterdir()):
+        if path.is_file():
+            digest.update(path.name.encode())
+            digest.update(file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def code_version(root=SOURCES):
+    """sha256 of the python sources, any change of the code invalidates the cached results."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(root).rglob("*.py")):
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Content addressed on-disk cache of the results of the compression cells.
+
+    A cell is identified by the hash of the dataset (the file or the folder of
+    columns the points are loaded from), the algorithm, the
+    window length, the limit, the evaluation deltas and the code version. Its
+    arrays (kept points, delays and evaluation of each trip) are stored in an
+    .npz file named after the hash of the key, next to a json of the key.
+    """
+
+    def __init__(self, dataset, folder="res/cache/", version=None):
+        self.dataset = folder_hash(dataset) if os.path.isdir(dataset) else file_hash(dataset)
+        self.folder = folder
+        self.version = code_version() if version is None else version
+
+    def key(
+        self, algorithm, window_length, limit, eval_delta, bwc_sttrace_delta, nys, distance=HAVERSINE
+    ):
+        """(hash, parameters) of a cell, computed with a projection (nys) and a distance backend."""
+        parameters = {
+            "dataset": self.dataset,
+            "algorithm": algorithm,
+            "window_ns": timedelta_ns(window_length),
+            "limit": int(limit),
+            "eval_delta_ns": timedelta_ns(eval_delta),
+            "bwc_sttrace_delta_ns": timedelta_ns(bwc_sttrace_delta),
+            "crs": nys.crs.to_string(),
+            "distance": distance.name,
+            "version": self.version,
+        }
+        encoded = json.dumps(parameters, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest(), parameters
+
+    def path(self, key):
+        return os.path.join(self.folder, key[:2], key)
+
+    def load(self, key):
+        """Arrays of the cell, None if not computed yet."""
+        fname = self.path(key) + ".npz"
+        if not os.path.exists(fname):
+            return None
+        with np.load(fname) as stored:
+            return {name: stored[name] for name in stored.files}
+
+    def store(self, key, parameters, arrays):
+        """Write the arrays of the cell, which must not be object arrays (they cannot be loaded)."""
+        objects = [name for name, array in arrays.items() if np.asarray(array).dtype.hasobject]
+        if objects:
+            raise ValueError(f"object arrays cannot be cached: {', '.join(objects)}")
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".json", "w") as f:
+            json.dump(parameters, f, indent=1)
+        # written aside then renamed, a cell is either complete or missing
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path + ".npz")
@@ -0,0 +1,68 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Named NumPy arrays stored in one shared memory block.
+
+    The parent process creates the block from a dict of arrays and passes its
+    descriptor to the workers. They attach() to it and get views of the same
+    memory instead of pickled copies. The views must be released before
+    close(), which frees the block. Object arrays (e.g. python str ids) are
+    refused: their items are pointers only valid in the creating process.
+    """
+
+    def __init__(self, arrays):
+        self.layout = {}
+        size = 0
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            if array.dtype.hasobject:
+                raise ValueError(
+                    f"array {name!r} of dtype object cannot be shared, convert it (e.g. astype(str))"
+                )
+            self.layout[name] = (size, array.dtype.str, array.shape)
+            size += -(-array.nbytes // 8) * 8  # keep every array 8 bytes aligned
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.arrays = views(self.shm, self.layout)
+        for name, array in arrays.items():
+            self.arrays[name][...] = array
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def descriptor(self):
+        return self.shm.name, self.layout
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+        self.shm.unlink()
+
+
+def views(shm, layout):
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        for name, (offset, dtype, shape) in layout.items()
+    }
+
+
+def attach(descriptor):
+    """
+    (shm, arrays) of a SharedArrays block created by another process.
+
+    Meant for the workers started by the creator, which share its resource
+    tracker: the block is unlinked by the creator, not when they exit.
+    """
+    name, layout = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, views(shm, layout)
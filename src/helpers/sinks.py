@@ -0,0 +1,54 @@
+import csv
+
+from src.helpers.utility import from_epoch_ns
+
+
+def point_wkt(point):
+    """MEOS text of a PriorityPoint, without building the TGeomPointInst."""
+    return f"POINT({point.x!r} {point.y!r})@{from_epoch_ns(point.t).isoformat(sep=' ')}"
+
+
+class CsvSink:
+    """
+    Append the kept points to a csv file with the columns of the preprocessed
+    datasets (id, point and sog, cog if available).
+    """
+
+    def __init__(self, fname, with_sog=False):
+        self.file = open(fname, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.with_sog = with_sog
+        self.writer.writerow(["id", "point", "sog", "cog"] if with_sog else ["id", "point"])
+
+    def __call__(self, time, kept):
+        for tid, points in kept.items():
+            for point in points:
+                row = [tid, point_wkt(point)]
+                if self.with_sog:
+                    row += [point.sog, point.cog]
+                self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class QueueSink:
+    """
+    Put (time, tid, [(t, x, y, sog, cog), ...]) items on a queue (queue.Queue,
+    multiprocessing.Queue, ...). Plain tuples are sent rather than the
+    PriorityPoints, which are linked to the rest of their trajectory.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __call__(self, time, kept):
+        for tid, points in kept.items():
+            rows = [(point.t, point.x, point.y, point.sog, point.cog) for point in points]
+            self.queue.put((time, tid, rows))
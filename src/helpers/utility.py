@@ -1,25 +1,91 @@
+from datetime import datetime, timedelta, timezone
+import math
+
 from shapely.geometry import Point, LineString
 import numpy as np
-import haversine
 import pandas as pd
 
-from pyproj import Proj
+from pymeos import TGeomPointInst, TGeomPointSeq
+
+from src.helpers.distance import HAVERSINE, haversine_distance, haversine_distances, projection
+
 
-from pymeos import TGeomPointSeq
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
 
 class PriorityPoint:
     """
     Class wrapping a point to compute its priority.
+
+    One is created per received point: the slots avoid a __dict__ per point.
     """
 
+    __slots__ = (
+        "tid", "t", "x", "y", "sog", "cog", "srid", "px", "py",
+        "priority", "prev", "next", "heap_seq", "_point",
+    )
+
     def __init__(self, row):
-        self.tid = row["id"]
-        self.point = row["point"]  # TGeomInst
+        point = row["point"]  # TGeomInst
+        value = point.value()
+        self.set_values(
+            row["id"],
+            to_epoch_ns(point.timestamp()),
+            value.x,
+            value.y,
+            row["sog"] if "sog" in row else None,
+            row["cog"] if "cog" in row else None,
+            point.srid(),
+        )
+        self.px = self.py = None
+        self._point = point
+
+    @classmethod
+    def from_values(cls, tid, t, x, y, sog=None, cog=None, srid=4326, px=None, py=None):
+        """Create a point from raw values, the TGeomInst is only built if needed."""
+        self = cls.__new__(cls)
+        self.set_values(tid, t, x, y, sog, cog, srid)
+        self.px, self.py = px, py
+        self._point = None
+        return self
+
+    def set_values(self, tid, t, x, y, sog, cog, srid):
+        self.tid = tid
+        self.t = t  # epoch nanoseconds
+        self.x, self.y = x, y  # px, py: projected coordinates, if computed
+        self.sog = sog
+        self.cog = cog
+        self.srid = srid
         self.priority = 0
-        if hasattr(row, "sog"):
-            self.sog = row["sog"]
-            self.cog = row["cog"]
+        self.prev = None  # previous kept point of the trajectory
+        self.next = None  # next kept point of the trajectory
+        self.heap_seq = None  # entry of the point in the PriorityQueue
+
+    @property
+    def point(self):
+        """The TGeomPointInst of the point."""
+        if self._point is None:
+            self._point = TGeomPointInst(
+                point=Point(self.x, self.y),
+                timestamp=from_epoch_ns(self.t),
+                srid=self.srid,
+            )
+        return self._point
+
+
+def to_epoch_ns(timestamp):
+    """Convert an aware datetime to integer nanoseconds since the epoch."""
+    return timedelta_ns(timestamp - EPOCH)
+
+
+def from_epoch_ns(t):
+    """Convert nanoseconds since the epoch to an aware datetime (microseconds)."""
+    return EPOCH + timedelta(microseconds=t // 1000)
+
+
+def timedelta_ns(delta):
+    """Convert a timedelta to integer nanoseconds."""
+    return (delta.days * 86400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1000
 
 
 def extract_wkt_from_traj(traj):
@@ -32,19 +98,115 @@ def extract_wkt_from_traj(traj):
     return res
 
 
+class LazyTrajectory:
+    """
+    Trajectory stored as (t, x, y) arrays (epoch ns, lon, lat).
+
+    Its TGeomPointSeq is only built on first access and then cached: the
+    MEOS methods (instants(), num_instants(), ...) are forwarded to it.
+    """
+
+    def __init__(self, t=None, x=None, y=None, srid=4326, instants=None):
+        # the arrays are computed from the instants (TGeomPointInst) if not given
+        self._arrays = None if t is None else (t, x, y)
+        self._srid = srid
+        self._instants = instants
+        self._sequence = None
+
+    @classmethod
+    def from_points(cls, points):
+        """Trajectory of a list of PriorityPoints."""
+        return cls(
+            np.array([point.t for point in points], dtype=np.int64),
+            np.array([point.x for point in points], dtype=np.float64),
+            np.array([point.y for point in points], dtype=np.float64),
+            points[0].srid,
+        )
+
+    @property
+    def arrays(self):
+        """The (t, x, y) arrays, the instants are not normalized as in the sequence."""
+        if self._arrays is None:
+            self._arrays = instants_arrays(self._instants)
+        return self._arrays
+
+    @property
+    def sequence(self):
+        """The TGeomPointSeq of the trajectory."""
+        if self._sequence is None:
+            instants = self._instants
+            if instants is None:
+                t, x, y = self._arrays
+                instants = [
+                    TGeomPointInst(point=Point(x_, y_), timestamp=from_epoch_ns(t_), srid=self._srid)
+                    for t_, x_, y_ in zip(t.tolist(), x.tolist(), y.tolist())
+                ]
+            self._sequence = TGeomPointSeq.from_instants(instants, upper_inc=True)
+        return self._sequence
+
+    def __getattr__(self, name):
+        if name.startswith("_"):  # e.g. probed by pandas or pickle, no need to build the sequence
+            raise AttributeError(name)
+        return getattr(self.sequence, name)
+
+    def __getstate__(self):
+        # MEOS objects cannot be pickled, only the arrays are kept
+        return {"_arrays": self.arrays, "_srid": self._srid, "_instants": None, "_sequence": None}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def __eq__(self, other):
+        return self.sequence == getattr(other, "sequence", other)
+
+    def __str__(self):
+        return str(self.sequence)
+
+    def __repr__(self):
+        return f"LazyTrajectory({len(self.arrays[0])} points)"
+
+
 def convert_points_trips(points):
-    def detect_short_trips(points):
-        small_trips = points.groupby("id").size()
-        return small_trips.loc[small_trips <= 1]
-
-    trips = (
-        points.loc[~points["id"].isin(detect_short_trips(points).index)]
-        .groupby("id")
-        .aggregate({"point": lambda x: TGeomPointSeq.from_instants(x, upper_inc=True)})
-        .rename({"point": "trajectory"}, axis=1)
+    """
+    Dataframe (trajectory column, indexed by id) of the LazyTrajectory of each id.
+
+    The trips of a single point are dropped. The arrays are taken from the
+    t, x, y columns if present (construct_instants).
+    """
+    ids = points["id"].to_numpy()
+    order = np.argsort(ids, kind="stable")
+    trip_ids, starts, counts = np.unique(ids[order], return_index=True, return_counts=True)
+    instants = points["point"].to_numpy()[order]
+    arrays = None
+    if {"t", "x", "y"}.issubset(points.columns):
+        arrays = [points[column].to_numpy()[order] for column in ("t", "x", "y")]
+
+    trajectories = {}
+    for tid, start, count in zip(trip_ids.tolist(), starts.tolist(), counts.tolist()):
+        if count <= 1:
+            continue
+        rows = slice(start, start + count)
+        t, x, y = (None,) * 3 if arrays is None else (column[rows] for column in arrays)
+        trajectories[tid] = LazyTrajectory(t, x, y, instants[start].srid(), list(instants[rows]))
+    index = pd.Index(list(trajectories), dtype=ids.dtype, name="id")
+    return pd.DataFrame({"trajectory": list(trajectories.values())}, index=index)
+
+
+def instants_arrays(instants):
+    """Return the (t, x, y) arrays (epoch ns, lon, lat) of TGeomPointInsts."""
+    values = [instant.value() for instant in instants]
+    return (
+        np.array([to_epoch_ns(instant.timestamp()) for instant in instants], dtype=np.int64),
+        np.array([value.x for value in values], dtype=np.float64),
+        np.array([value.y for value in values], dtype=np.float64),
     )
 
-    return trips
+
+def trajectory_arrays(trajectory):
+    """Return the (t, x, y) arrays (epoch ns, lon, lat) of a TGeomPointSeq or LazyTrajectory."""
+    if isinstance(trajectory, LazyTrajectory):
+        return trajectory.arrays
+    return instants_arrays(trajectory.instants())
 
 
 def convert_trips_points(trip_id, trajectory, sort=True):
@@ -65,32 +227,62 @@ def convert_trips_points(trip_id, trajectory, sort=True):
 ##########################################################################
 
 
-def get_expected_pos_sog(start, time, nys):
-    """For AIS DATA. To adapt if other datasources."""
-    start_time = start.point.timestamp()
-    start_pt = Point(nys(start.point.value().x, start.point.value().y))
+def get_expected_pos_sog(start, time):
+    """For AIS DATA. To adapt if other datasources.
 
+    Returns the projected (x, y) extrapolated from the SOG and COG of start.
+    """
     speed = start.sog * 1852 / 3600  # from knots to m/s
-    angle = (
-        ((start.cog) % 360) * np.pi / 180
-    )  # angle degree % true north -> angle in radians
-    delta = (time - start_time).seconds
-
-    expected_pos = Point(
-        start_pt.x + delta * speed * np.sin(float(angle)),
-        start_pt.y + delta * speed * np.cos(float(angle)),
+    angle = math.radians(start.cog % 360)  # angle degree % true north -> angle in radians
+    delta = (time - start.t) / 1e9
+
+    return (
+        start.px + delta * speed * math.sin(angle),
+        start.py + delta * speed * math.cos(angle),
     )
 
-    return expected_pos
 
+def get_expected_pos_anteprev(time, prev, anteprev):
+    """Projected (x, y) extrapolated from the velocity between anteprev and prev."""
+    dt = (prev.t - anteprev.t) / 1e9
+    vx, vy = (prev.px - anteprev.px) / dt, (prev.py - anteprev.py) / dt
+    new_dt = (time - prev.t) / 1e9
+    return prev.px + vx * new_dt, prev.py + vy * new_dt
 
-def get_expected_pos_anteprev(time, prev, anteprev, nys):
-    prev_pt = Point(nys(prev.point.value().x, prev.point.value().y))
-    anteprev_pt = Point(nys(anteprev.point.value().x, anteprev.point.value().y))
-    dt = (prev.point.timestamp() - anteprev.point.timestamp()).total_seconds()
-    vx, vy = (prev_pt.x - anteprev_pt.x) / dt, (prev_pt.y - anteprev_pt.y) / dt
-    new_dt = (time - prev.point.timestamp()).total_seconds()
-    return Point(prev_pt.x + vx * new_dt, prev_pt.y + vy * new_dt)
+
+def sed_distance(ax, ay, at, bx, by, bt, cx, cy, ct):
+    """Synchronized euclidean distance (m) of B to the segment AC.
+
+    Coordinates are lon/lat degrees and times epoch nanoseconds. The
+    synchronized point is linearly interpolated in lon/lat, as done by
+    TGeomPointSeq.value_at_timestamp, so the result matches the MEOS based
+    computation up to floating point rounding (< 1e-6 m). Unlike pymeos, which
+    drops the sub-second part of the timestamp, the exact times are used.
+    """
+    if ct == at:
+        return haversine_distance(bx, by, ax, ay)
+    ratio = (bt - at) / (ct - at)
+    return haversine_distance(bx, by, ax + ratio * (cx - ax), ay + ratio * (cy - ay))
+
+
+def sed_distances(ax, ay, at, bx, by, bt, cx, cy, ct):
+    """Vectorized sed_distance over arrays of A, B and C points."""
+    at, bt, ct = (np.asarray(t, dtype=np.int64) for t in (at, bt, ct))
+    span = ct - at
+    ratio = np.divide(
+        (bt - at).astype(np.float64),
+        span.astype(np.float64),
+        out=np.zeros(span.shape),
+        where=span != 0,
+    )
+    return haversine_distances(
+        bx, by, ax + ratio * (np.asarray(cx) - ax), ay + ratio * (np.asarray(cy) - ay)
+    )
+
+
+def compute_SED_points(A, B, C, distance=HAVERSINE):
+    """Return the SED of PriorityPoint B to segment AC, with a distance backend."""
+    return distance.sed(A, B, C)
 
 
 def compute_SED(A, B, C, nys, synchronized=True):
@@ -101,27 +293,52 @@ def compute_SED(A, B, C, nys, synchronized=True):
 
     point = B.value()
 
-    line = TGeomPointSeq.from_instants([A, C])
-
     if synchronized:
-        synchronized_point = line.value_at_timestamp(B.timestamp())
-        distance = (
-            haversine.haversine(
-                (point.y, point.x), (synchronized_point.y, synchronized_point.x)
-            )
-            * 1000
+        a, c = A.value(), C.value()
+        distance = sed_distance(
+            a.x, a.y, to_epoch_ns(A.timestamp()),
+            point.x, point.y, to_epoch_ns(B.timestamp()),
+            c.x, c.y, to_epoch_ns(C.timestamp()),
         )
     else:
         # nys=Proj('EPSG:25832')
+        line = TGeomPointSeq.from_instants([A, C])
         point_proj = nys(point.x, point.y)
         line_proj = LineString([nys(p.value().x, p.value().y) for p in line.instants()])
         distance = Point(point_proj).distance(line_proj)
     return distance
 
 
+def removal_error(previous, point, following, reference, delta, distance=HAVERSINE):
+    """Increase of the error if point is removed between previous and following.
+
+    The error is the sum of the distances between the reference (original)
+    trajectory, given as (t, x, y) arrays, and the compressed one every delta
+    nanoseconds after previous. Both are interpolated in one vectorized call.
+    """
+    start = previous.t
+    times = np.arange(delta, following.t - start, delta, dtype=np.int64)
+    if len(times) == 0:
+        return 0
+    t, x, y = reference
+    times = times.astype(np.float64)
+    offsets = (t - start).astype(np.float64)
+    correct_x, correct_y = np.interp(times, offsets, x), np.interp(times, offsets, y)
+
+    knots = [0.0, float(point.t - start), float(following.t - start)]
+    old_x = np.interp(times, knots, [previous.x, point.x, following.x])
+    old_y = np.interp(times, knots, [previous.y, point.y, following.y])
+    new_x = np.interp(times, knots[::2], [previous.x, following.x])
+    new_y = np.interp(times, knots[::2], [previous.y, following.y])
+
+    new_error = distance.distances(correct_x, correct_y, new_x, new_y).sum()
+    old_error = distance.distances(correct_x, correct_y, old_x, old_y).sum()
+    return float(new_error - old_error)
+
+
 def compute_distance(A, B, crs):
     """Computes the distance between two points in meters."""
-    nys = Proj(crs)
+    nys = projection(crs)
     projA = Point(nys(A.x, A.y))
     projB = Point(nys(B.x, B.y))
     return projA.distance(projB)
@@ -132,35 +349,84 @@ def compute_distance(A, B, crs):
 ##########################################################################
 
 
-def assess_single_trajectory(compressed, original, delta, crs="EPSG:25832"):
-    """The score will be the average distance of at regular interval of original trip to the compressed trajectory."""
-    score = 0
-    nmbr_instants = 0
-    compressed_start = compressed.start_instant().timestamp()
-    compressed_end = compressed.end_instant().timestamp()
-    mx_distance = 0
+def sample_times(start, end, delta):
+    """Evaluation times start + k * delta (k >= 1) strictly before end (epoch ns)."""
+    return np.arange(start + delta, end, delta, dtype=np.int64)
 
-    time = compressed_start + delta
 
-    while time < compressed_end:
-        point = original.value_at_timestamp(time)
+def interpolate(arrays, times):
+    """Positions of the (t, x, y) trajectory at times (linear interpolation)."""
+    t, x, y = arrays
+    offsets = (t - t[0]).astype(np.float64)
+    times = (times - t[0]).astype(np.float64)
+    return np.interp(times, offsets, x), np.interp(times, offsets, y)
 
-        point_compressed = compressed.value_at_timestamp(time)
-        distance = (
-            haversine.haversine(
-                (point.y, point.x), (point_compressed.y, point_compressed.x)
-            )
-            * 1000
+
+def trip_distances(original, compressed, delta, cache=None, tid=None, distance=HAVERSINE):
+    """Distances (m) between the original and each compressed trajectory.
+
+    All trajectories are (t, x, y) arrays. As in assess_single_trajectory the
+    distance is sampled every delta ns after the start of the compressed
+    trajectory until its end. The original is sampled once for all the
+    compressed trajectories starting at the same time, or taken from the
+    ReferenceCache if one is given. distance is the distance backend.
+    """
+    ends = {}
+    for arrays in compressed:
+        start = int(arrays[0][0])
+        ends[start] = max(ends.get(start, start), arrays[0][-1])
+    samples = {}
+    for start, end in ends.items():
+        if cache is not None:
+            samples[start] = cache.samples(tid, original, start, delta)
+        else:
+            times = sample_times(start, end, delta)
+            samples[start] = (times,) + interpolate(original, times)
+
+    distances = []
+    for arrays in compressed:
+        times, original_x, original_y = samples[int(arrays[0][0])]
+        n = np.searchsorted(times, arrays[0][-1], side="left")
+        compressed_x, compressed_y = interpolate(arrays, times[:n])
+        distances.append(
+            distance.distances(original_x[:n], original_y[:n], compressed_x, compressed_y)
         )
-        # distance = compute_distance(point, point_compressed, crs)
+    return distances
 
-        if distance > mx_distance:
-            mx_distance = distance
-        score += distance
-        nmbr_instants += 1
-        time += delta
 
-    return score, nmbr_instants, mx_distance
+def trip_maxima(distances):
+    """Max distance of each trip, 0 for the trips without evaluated points."""
+    return [d.max() if len(d) else 0 for d in distances]
+
+
+def distance_statistics(distances, percentiles=(90, 95, 99)):
+    """Average, max, median and percentiles of the distances of all the trips.
+
+    As in algorithm_scores, the max of a trip without evaluated points is 0.
+    """
+    all_distances = np.concatenate(distances) if distances else np.empty(0)
+    maxima = np.array(trip_maxima(distances))
+    if len(all_distances) == 0:
+        return {}
+    stats = {
+        "avg_error": all_distances.mean(),
+        "max_error": all_distances.max(),
+        "med_error": np.median(all_distances),
+    }
+    for percentile, value in zip(percentiles, np.percentile(all_distances, percentiles)):
+        stats[f"p{percentile}_error"] = value
+    stats["avg_max"] = maxima.mean()
+    stats["med_max"] = np.median(maxima)
+    return stats
+
+
+def assess_single_trajectory(compressed, original, delta, crs="EPSG:25832"):
+    """The score will be the average distance of at regular interval of original trip to the compressed trajectory."""
+    (distances,) = trip_distances(
+        trajectory_arrays(original), [trajectory_arrays(compressed)], timedelta_ns(delta)
+    )
+    mx_distance = distances.max() if len(distances) else 0
+    return distances.sum(), len(distances), mx_distance
 
 
 def assess_single_trajectory_instants(compressed, original):
@@ -183,12 +449,7 @@ def assess_single_trajectory_instants(compressed, original):
 
         point_compressed = compressed.value_at_timestamp(timestamp)
 
-        distance = (
-            haversine.haversine(
-                (point.y, point.x), (point_compressed.y, point_compressed.x)
-            )
-            * 1000
-        )
+        distance = haversine_distance(point.x, point.y, point_compressed.x, point_compressed.y)
         if distance > mx_distance:
             mx_distance = distance
         score += distance
@@ -200,35 +461,61 @@ def assess_single_trajectory_instants(compressed, original):
     return score, nmbr_instants, mx_distance
 
 
-def assess_algorithms(trips, algorithms, original_column, precision):
-    trip_ids = trips.index.values.tolist()
-
-    scores = {algorithm: 0 for algorithm in algorithms}
-    total_points = {algorithm: 0 for algorithm in algorithms}
-    mx_distances = {algorithm: [] for algorithm in algorithms}
-
-    for algorithm in algorithms:
-        # print()
-        # print(algorithm, end=": ")
-        for i, trip_id in enumerate(trip_ids):
-            if i % 10 == 0:
-                # print(i, end=" ")
-                continue
-            score, points, dist = assess_single_trajectory(
-                original=trips.loc[trip_id][original_column],
-                compressed=trips.loc[trip_id][algorithm],
-                delta=precision,
-            )
-            scores[algorithm] += score
-            total_points[algorithm] += points
-            mx_distances[algorithm].append(dist)
+def evaluate_algorithms(trips, algorithms, original_column, precision, cache=None, distance=HAVERSINE):
+    """Distances (arrays per trip) of the compressed trajectories of each algorithm.
+
+    cache is an optional ReferenceCache shared between calls, distance the
+    distance backend.
+    """
+    delta = timedelta_ns(precision)
+    originals = trips[original_column].to_numpy()
+    columns = [trips[algorithm].to_numpy() for algorithm in algorithms]
+    distances = {algorithm: [] for algorithm in algorithms}
+
+    for i, (tid, original) in enumerate(zip(trips.index, originals)):
+        if i % 10 == 0:
+            # print(i, end=" ")
+            continue
+        if cache is not None:
+            reference = cache.reference(tid, original)
+        else:
+            reference = trajectory_arrays(original)
+        compressed = [trajectory_arrays(column[i]) for column in columns]
+        for algorithm, trip in zip(
+            algorithms, trip_distances(reference, compressed, delta, cache, tid, distance)
+        ):
+            distances[algorithm].append(trip)
+    return distances
+
+
+def assess_algorithms(trips, algorithms, original_column, precision, cache=None, distance=HAVERSINE):
+    return algorithm_scores(
+        evaluate_algorithms(trips, algorithms, original_column, precision, cache, distance)
+    )
 
-    for algorithm, s in scores.items():
-        scores[algorithm] = s / total_points[algorithm]
+
+def algorithm_scores(distances):
+    """Average distance of each algorithm and the max distance of each of its trips."""
+    scores, mx_distances = {}, {}
+    for algorithm, trips_distances in distances.items():
+        total_points = sum(len(d) for d in trips_distances)
+        scores[algorithm] = sum(d.sum() for d in trips_distances) / total_points
+        mx_distances[algorithm] = trip_maxima(trips_distances)
 
     return scores, mx_distances
 
 
+def assess_algorithms_statistics(
+    trips, algorithms, original_column, precision, cache=None, distance=HAVERSINE
+):
+    """Dataframe of the distance_statistics of each algorithm."""
+    distances = evaluate_algorithms(trips, algorithms, original_column, precision, cache, distance)
+    return pd.DataFrame.from_dict(
+        {algorithm: distance_statistics(d) for algorithm, d in distances.items()},
+        orient="index",
+    )
+
+
 def compile_trips(results, original_trips):
     """Results should be dico[name]:TGeomPointSequence"""
 
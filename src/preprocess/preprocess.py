@@ -1,8 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor
+
 from pymeos import TGeomPointInst, TGeomPointSeq, STBox
+from pyproj import Geod
 import shapely as shp
+import numpy as np
 import pandas as pd
 
-from src.helpers.utility import extract_wkt_from_traj
+from src.helpers.columns import instant_times
+from src.helpers.utility import extract_wkt_from_traj, to_epoch_ns
 
 import movingpandas as mpd
 
@@ -12,29 +17,60 @@ warnings.filterwarnings('ignore')
 from tqdm import tqdm
 tqdm.pandas()
 
+GEOD = Geod(ellps='WGS84')
+
 def construct_instants(raw, srid):
-    """Remove uncessary columns and create sequences."""    
+    """Remove uncessary columns and create sequences.
+
+    The coordinates and epoch ns times are also kept in the x, y and t columns
+    so that the filters can work on arrays.
+    """    
     df = raw.copy()
     df['point'] = df.progress_apply(lambda row: TGeomPointInst(point=shp.Point(row['Longitude'], row['Latitude']), 
                                                              timestamp=row['Timestamp'], srid=srid),
                                     axis=1)
+    df['t'] = instant_times(df['point'])
+    df['x'] = df['Longitude'].astype(np.float64)
+    df['y'] = df['Latitude'].astype(np.float64)
     df.drop(['Latitude', 'Longitude', 'Timestamp'], axis=1, inplace=True)
     return df
 
+def point_arrays(points):
+    """(t, x, y) arrays of the points, from the t, x, y columns if present."""
+    if {'t', 'x', 'y'}.issubset(points.columns):
+        return points['t'].to_numpy(), points['x'].to_numpy(), points['y'].to_numpy()
+    values = [point.value() for point in points['point']]
+    return (instant_times(points['point']),
+            np.array([value.x for value in values], dtype=np.float64),
+            np.array([value.y for value in values], dtype=np.float64))
+
 def filter_points_period(points, period):
-    points_index = points['point'].progress_map(lambda point: point.is_temporally_contained_in(period))
-    return points[points_index]
+    """Points whose time is in the period (as is_temporally_contained_in)."""
+    t, _, _ = point_arrays(points)
+    tmin, tmax = to_epoch_ns(period.tmin()), to_epoch_ns(period.tmax())
+    after = (t > tmin) | ((t == tmin) & period.tmin_inc())
+    before = (t < tmax) | ((t == tmax) & period.tmax_inc())
+    return points[after & before]
 
 def filter_points_tbox(points, box):
-    # TL = shp.set_srid(shp.Point(*box["TL"]), srid)
-    # BR = shp.set_srid(shp.Point(*box["BR"]), srid)
-    points_index = points['point'].progress_map(lambda point: point.ever_intersects(box))
-    return points[points_index]
+    """Points in the spatial extent of the box, borders included (as ever_intersects)."""
+    _, x, y = point_arrays(points)
+    inside = (x >= box.xmin()) & (x <= box.xmax()) & (y >= box.ymin()) & (y <= box.ymax())
+    return points[inside]
+
+def filter_points_area(points, areas):
+    """Points intersecting one of the shapely (multi)polygons of areas, through an STRtree."""
+    _, x, y = point_arrays(points)
+    areas = [areas] if isinstance(areas, shp.Geometry) else list(areas)
+    tree = shp.STRtree(areas)
+    matched, _ = tree.query(shp.points(x, y), predicate='intersects')
+    inside = np.zeros(len(points), dtype=bool)
+    inside[matched] = True
+    return points[inside]
 
 
 def filter_outliers(points, outliers):
-    points_index = points['id'].progress_map(lambda x: x not in outliers)
-    return points[points_index]
+    return points[~points['id'].isin(outliers)]
 
 
 
@@ -59,7 +95,86 @@ def clean_all_trips(init_trips, vmax):
     return trips   
 
 
+# Native speed based cleaning (same semantics as the movingpandas OutlierCleaner)
+def speed_filter(tid, t, x, y, vmax, workers=None):
+    """Mask of the points kept by the speed cleaning of their trip.
+
+    The points must be sorted by trip then time (epoch ns). As in
+    OutlierCleaner, a point is dropped if its geodesic speed (m/s) from the
+    last kept point of the trip exceeds vmax, and a trip left with less than
+    2 points is kept unchanged. The speeds between consecutive points are
+    computed for all the trips at once, only the trips with a violation are
+    then cleaned point by point, on a process pool if workers is given.
+    """
+    keep = np.ones(len(t), dtype=bool)
+    if len(t) < 2:
+        return keep
+    same_trip = tid[1:] == tid[:-1]
+    speeds = speeds_between(x[:-1], y[:-1], t[:-1], x[1:], y[1:], t[1:])
+    violating = set(tid[1:][same_trip & (speeds > vmax)].tolist())
+    if not violating:
+        return keep
+
+    starts = np.flatnonzero(np.r_[True, ~same_trip])
+    ends = np.r_[starts[1:], len(t)]
+    trips = [(start, end) for start, end in zip(starts, ends) if tid[start] in violating]
+    tasks = [(t[start:end], x[start:end], y[start:end], vmax) for start, end in trips]
+    if workers:
+        with ProcessPoolExecutor(workers) as pool:
+            masks = list(pool.map(clean_trip, *zip(*tasks), chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        masks = [clean_trip(*task) for task in tasks]
+    for (start, end), mask in zip(trips, masks):
+        keep[start:end] = mask
+    return keep
+
+
+def speeds_between(x1, y1, t1, x2, y2, t2):
+    """Geodesic (WGS84) speeds in m/s between the points, as movingpandas get_speed."""
+    _, _, distances = GEOD.inv(x1, y1, x2, y2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.asarray(distances) / ((np.asarray(t2) - np.asarray(t1)) / 1e9)
+
+
+def clean_trip(t, x, y, vmax):
+    """Sequential cleaning of a trip: the speed is computed from the last kept point."""
+    keep = np.ones(len(t), dtype=bool)
+    previous = 0
+    for i in range(1, len(t)):
+        if speeds_between(x[previous], y[previous], t[previous], x[i], y[i], t[i]) > vmax:
+            keep[i] = False  # do NOT update the previous point
+        else:
+            previous = i
+    if keep.sum() < 2:
+        keep[:] = True  # invalid result, the original trajectory is returned
+    return keep
+
+
+def clean_points(points, vmax, workers=None):
+    """Points kept by the speed cleaning of their trips, the trips of a single point are dropped.
+
+    Same points as clean_all_trips on the trips of the points followed by
+    raw_points_from_clean_trips, in their original order.
+    """
+    t, x, y = point_arrays(points)
+    tid = points['id'].to_numpy()
+    order = np.lexsort((t, tid))
+    sorted_tid = tid[order]
+    keep = speed_filter(sorted_tid, t[order], x[order], y[order], vmax, workers)
+    _, trip_index, sizes = np.unique(sorted_tid, return_inverse=True, return_counts=True)
+    keep &= sizes[trip_index] > 1
+    kept = np.empty(len(keep), dtype=bool)
+    kept[order] = keep
+    return points[kept]
+
+
 def raw_points_from_clean_trips(trips_cleaned, raw_points):
-    id_ts = {ind: [instant.timestamp() for instant in row.trajectory.instants()] for ind, row in trips_cleaned.iterrows()}
-    points = [point for _,point in raw_points.iterrows() if point.point.timestamp() in id_ts.get(point.id, [])]
-    return pd.DataFrame(points) # raw_points[poins_filtered_index]
+    """Raw points (all their columns, in their order) whose (id, time) is an instant of the cleaned trips."""
+    instants = [trajectory.instants() for trajectory in trips_cleaned['trajectory']]
+    times = instant_times([instant for trip in instants for instant in trip])
+    ids = np.repeat(trips_cleaned.index.to_numpy(), [len(trip) for trip in instants])
+    cleaned = pd.MultiIndex.from_arrays([ids, times])
+
+    t, _, _ = point_arrays(raw_points)
+    kept = pd.MultiIndex.from_arrays([raw_points['id'].to_numpy(), t]).isin(cleaned)
+    return raw_points[kept]
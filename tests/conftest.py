@@ -2,8 +2,7 @@ import pytest
 import os
 from pymeos import pymeos_initialize, STBox
 from src.preprocess.preprocess import *
-from src.helpers.utility import compute_trips
-from src.helpers.data_loader import load_csv_to_df, save_df_to_csv
+from src.helpers.data_loader import load_csv_to_df, save_df_to_csv, save_columns, has_columns
 from src.helpers.data_loader import filename
 
 
@@ -75,7 +74,7 @@ def preprocess(dataset):
         raw = load_csv_to_df(dataset["name"], dataset["raw_columns"], RENAME_COLS, preprocessed=False)
         instants = construct_instants(raw, dataset["srid"])
         # no filtering for ais_sample
-        if "outlier" in dataset:
+        if "outliers" in dataset:
             instants = filter_outliers(instants, dataset["outliers"])
         if "filter_period" in dataset:
             instants = filter_points_period(instants, dataset["filter_period"])
@@ -85,15 +84,17 @@ def preprocess(dataset):
         print("filtered:", len(instants))
         
 
-        trips = compute_trips(instants)
-        print("trips:", len(trips))
-        trips_clean = clean_all_trips(trips, vmax=dataset["vmax"])
-        instants_clean = raw_points_from_clean_trips(trips_clean, instants)
-        save_df_to_csv(dataset["name"], instants_clean)
+        print("trips:", instants["id"].nunique())
+        instants_clean = clean_points(instants, vmax=dataset["vmax"], workers=os.cpu_count())
+        save_df_to_csv(dataset["name"], instants_clean.drop(columns=["t", "x", "y"]))
+        save_columns(dataset["name"], instants_clean, dataset["srid"])
         print(len(instants_clean))
     else:
         print(dataset["name"])
-        instants = load_csv_to_df(dataset["name"], columns=("id", "point"))
+        columns = ("id", "sog", "cog", "point") if "SOG" in dataset["raw_columns"] else ("id", "point")
+        instants = load_csv_to_df(dataset["name"], columns=columns)
+        if not has_columns(dataset["name"]):
+            save_columns(dataset["name"], instants, dataset["srid"])
         # print(len(instants))
     return 1
 
@@ -0,0 +1,16 @@
+import numpy as np
+
+from src.helpers.buffer import TrajectoryBuffer
+
+
+def test_buffer_keeps_recent_points_in_bounded_memory():
+    buffer = TrajectoryBuffer(capacity=4)
+    for i in range(1000):
+        buffer.append(i * 10, i * 0.5, -i)
+        if i % 7 == 0:
+            buffer.discard_before((i - 5) * 10)
+
+    t, x, y = buffer.arrays()
+    assert t[0] == 9890 and t[-1] == 9990 and len(buffer) == 11
+    assert np.array_equal(x, t / 20) and np.array_equal(y, -t / 10)
+    assert len(buffer.t) <= 32
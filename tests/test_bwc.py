@@ -17,13 +17,20 @@ import os
 # Add the project root to the PYTHONPATH
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-import src.bwc.dr as BWC_DR
-import src.bwc.sttrace as BWC_STTrace
-import src.bwc.sttrace_delay as BWC_STTrace_Delay
-import src.bwc.STTraceImp as BWC_STTrace_Imp
-import src.bwc.STTraceImp_delay as BWC_STTrace_Imp_Delay
-import src.bwc.squish as BWC_SQUISH
-from src.helpers.data_loader import load_csv_to_df
+from src.bwc.runner import ALGORITHMS, compress_all
+from src.bwc.sweep import run_sweep, sweep_cells, write_sweep
+from src.helpers.data_loader import (
+    columns_folder,
+    filename,
+    has_columns,
+    load_columns,
+    load_csv_columns,
+    load_csv_to_df,
+)
+from src.helpers.columns import PointColumns
+from src.helpers.distance import HAVERSINE, distance_backend
+from src.helpers.reference_cache import ReferenceCache
+from src.helpers.result_cache import ResultCache
 from src.helpers.utility import convert_points_trips, assess_algorithms, compile_trips
 
 import concurrent.futures
@@ -52,12 +59,14 @@ def evaluate_dataset_case(test_name):
     columns = CONFIG_TEST["columns"]
     tests = CONFIG_TEST["subtests"]
     nys = Proj(CONFIG_TEST["proj"], preserve_units=True)
+    distance = distance_backend(CONFIG_TEST.get("DISTANCE", "haversine"), nys)
     bwc_sttrace_delta = timedelta(
         **{CONFIG_TEST["OPTREG_FREQ_UNIT"]: CONFIG_TEST.as_int("OPTREG_FREQ")}
     )
 
     points = load_csv_to_df(dataset, columns)
     trips = convert_points_trips(points)  # create trips here
+    points = PointColumns.from_dataframe(points)  # decoded once for all algorithms
     print(dataset, columns)
 
     algorithms = [
@@ -71,6 +80,7 @@ def evaluate_dataset_case(test_name):
 
     all_res = pd.DataFrame(index=algorithms)
     all_mean_delays = pd.DataFrame(index=algorithms)
+    cache = ReferenceCache()  # ground truth sampled once for all the subtests
     for test in tests:
         print(test)
         CONFIG = CONFIG_GLOBAL[test]  # subtest config
@@ -92,6 +102,8 @@ def evaluate_dataset_case(test_name):
             nys=nys,
             npoints=npoints,
             bwc_sttrace_delta=bwc_sttrace_delta,
+            cache=cache,
+            distance=distance,
         )
 
         res = res.rename(columns={"avg_error": test})
@@ -108,6 +120,42 @@ def evaluate_dataset_case(test_name):
     all_res.to_csv("res/bwc_compression/all.csv", mode="w")
 
 
+def sweep_dataset_case(test_name, workers=None):
+    """Same results as evaluate_dataset_case, with all the (algorithm, subtest) cells on a process pool."""
+    CONFIG_GLOBAL = ConfigObj("tests/bwc_tests_config.ini")
+    CONFIG_TEST = CONFIG_GLOBAL[test_name]
+    nys = Proj(CONFIG_TEST["proj"], preserve_units=True)
+    distance = distance_backend(CONFIG_TEST.get("DISTANCE", "haversine"), nys)
+    bwc_sttrace_delta = timedelta(
+        **{CONFIG_TEST["OPTREG_FREQ_UNIT"]: CONFIG_TEST.as_int("OPTREG_FREQ")}
+    )
+
+    if has_columns(CONFIG_TEST["dataset"]):
+        points = load_columns(CONFIG_TEST["dataset"])  # memory-mapped, no parsing
+        source = columns_folder(CONFIG_TEST["dataset"])
+    else:
+        points = load_csv_columns(CONFIG_TEST["dataset"], CONFIG_TEST["columns"])
+        source = filename(CONFIG_TEST["dataset"], preprocessed=True)
+    # the cells already computed on the same data with the same code are not recomputed
+    cache = ResultCache(source)
+    results, delays = run_sweep(
+        points,
+        list(ALGORITHMS),
+        sweep_cells(CONFIG_GLOBAL, test_name),
+        nys,
+        eval_delta=bwc_sttrace_delta / 2,
+        bwc_sttrace_delta=bwc_sttrace_delta,
+        workers=workers,
+        cache=cache,
+        distance=distance,
+    )
+    print(results)
+    print()
+    print("delays:")
+    print(delays)
+    write_sweep(results, delays)
+
+
 def compress_and_evaluate(points, trips, algorithms, **kwargs):
     compressed_trajectories, delays = {}, {}
     compressed_trajectories, delays = compress_bwc(points, trips, algorithms, compressed_trajectories, delays, **kwargs)
@@ -115,108 +163,50 @@ def compress_and_evaluate(points, trips, algorithms, **kwargs):
     all_compressed_trajectories = compile_trips(compressed_trajectories, trips)
     
 
-    res = assess_compression(all_compressed_trajectories, algorithms, kwargs["eval_delta"])
+    res = assess_compression(
+        all_compressed_trajectories,
+        algorithms,
+        kwargs["eval_delta"],
+        kwargs.get("cache"),
+        kwargs.get("distance", HAVERSINE),
+    )
     mean_delays = analyse_delays(delays)
 
     return res, mean_delays
 
 
 def compress_bwc(points, trips, algos, compressed_trajectories={}, delays={}, **kwargs):
-    if "BWC_STTrace_Delay" in algos:
-        print("bwcsttrace_delay start")
-        bwc_sttrace_delay = BWC_STTrace_Delay.BWC_STTrace_Delay(
-            points,
-            window_lenght=kwargs["w_length"],
-            limit=kwargs["npoints"],
-            nys=kwargs["nys"],
-        )
-        bwc_sttrace_delay.compress()
-        compressed_trajectories["BWC_STTrace_Delay"] = bwc_sttrace_delay.trips
-        delays["BWC_STTrace_Delay"] = bwc_sttrace_delay.delays
-        print("BWCCSTTRace_Delay finished")
-    if "BWC_STTrace_Imp_Delay" in algos:
-        print("bwcsttraceImp_delay start")
-        bwc_sttrace_imp_delay = BWC_STTrace_Imp_Delay.BWC_STTrace_Imp_Delay(
-            points,
-            window_lenght=kwargs["w_length"],
-            limit=kwargs["npoints"],
-            nys=kwargs["nys"],
-            init_trips=trips,
-            eval_delta=kwargs["bwc_sttrace_delta"],
-        )
-        bwc_sttrace_imp_delay.compress()
-        compressed_trajectories["BWC_STTrace_Imp_Delay"] = bwc_sttrace_imp_delay.trips
-        delays["BWC_STTrace_Imp_Delay"] = bwc_sttrace_imp_delay.delays
-        print("BWCCSTTRaceImp_Delay finished")
-    if "BWC_STTrace" in algos:
-        print("bwcsttrace start")
-        bwc_sttrace = BWC_STTrace.BWC_STTrace(
-            points,
-            window_lenght=kwargs["w_length"],
-            limit=kwargs["npoints"],
-            nys=kwargs["nys"],
-        )
-        bwc_sttrace.compress()
-        compressed_trajectories["BWC_STTrace"] = bwc_sttrace.trips
-        delays["BWC_STTrace"] = bwc_sttrace.delays
-        print("BWCCSTTRace finished")
-
-    if "BWC_Squish" in algos:
-        print("bwcsquish start")
-        bwc_squish = BWC_SQUISH.BWC_SQUISH(
-            points,
-            window_lenght=kwargs["w_length"],
-            limit=kwargs["npoints"],
-            nys=kwargs["nys"],
-        )
-        bwc_squish.compress()
-        compressed_trajectories["BWC_Squish"] = bwc_squish.trips
-        delays["BWC_Squish"] = bwc_squish.delays
-        print("bwcsquish finished")
-
-
-    if "BWC_STTrace_Imp" in algos:
-        print("bwcsttraceImp start")
-        bwc_sttrace_imp = BWC_STTrace_Imp.BWC_STTrace_Imp(
-            points,
-            window_lenght=kwargs["w_length"],
-            limit=kwargs["npoints"],
-            nys=kwargs["nys"],
-            init_trips=trips,
-            eval_delta=kwargs["bwc_sttrace_delta"],
-        )
-        bwc_sttrace_imp.compress()
-        compressed_trajectories["BWC_STTrace_Imp"] = bwc_sttrace_imp.trips
-        delays["BWC_STTrace_Imp"] = bwc_sttrace_imp.delays
-        print("BWCCSTTRaceImp finished")
-
-    if "BWC_DR" in algos:
-        print("bwc DR start")
-        bwc_dr = BWC_DR.BWC_DR(
-            points,
-            window_lenght=kwargs["w_length"],
-            limit=kwargs["npoints"],
-            nys=kwargs["nys"],
-        )
-        bwc_dr.compress()
-        bwc_dr.finalize_trips()
-        compressed_trajectories["BWC_DR"] = bwc_dr.finalized_trips
-        delays["BWC_DR"] = bwc_dr.delays
-        print("BWC_DR finished")
-
-
+    # the points are decoded once and fanned out to all the algorithms
+    print("compression start:", ", ".join(algos))
+    trajectories, algorithm_delays = compress_all(
+        points,
+        algos,
+        window_lenght=kwargs["w_length"],
+        limit=kwargs["npoints"],
+        nys=kwargs["nys"],
+        eval_delta=kwargs["bwc_sttrace_delta"],
+        init_trips=trips,
+        workers=kwargs.get("workers"),
+        distance=kwargs.get("distance"),
+    )
+    compressed_trajectories.update(trajectories)
+    delays.update(algorithm_delays)
+    print("compression finished")
 
     return compressed_trajectories, delays
 
 
-def assess_compression(all_compressed_trajectories, algorithms, eval_delta):
+def assess_compression(
+    all_compressed_trajectories, algorithms, eval_delta, cache=None, distance=HAVERSINE
+):
     num_points = {}
     for algo in algorithms:
         # print(algo)
         if algo in all_compressed_trajectories:
+            # kept points, counted on the arrays without building the MEOS sequences
             num_point = sum(
                 [
-                    len(trajectory.instants())
+                    len(trajectory.arrays[0])
                     for trajectory in all_compressed_trajectories[algo]
                 ]
             )
@@ -229,6 +219,8 @@ def assess_compression(all_compressed_trajectories, algorithms, eval_delta):
         algorithms,
         "Original",
         precision=eval_delta,
+        cache=cache,
+        distance=distance,
     )
 
     res = compile_results(scores, distances, num_points, algos=algorithms)
@@ -247,7 +239,9 @@ def analyse_delays(delays):
 
 
 def compile_results(scores, distances, num_points, algos):
-    columns = ["#remaining", "avg_error", "avg_max", "max_max", "med_max"]
+    # #kept: points kept by the compression, before the MEOS normalization of
+    # the sequences (formerly #remaining, the instants of the normalized sequences)
+    columns = ["#kept", "avg_error", "avg_max", "max_max", "med_max"]
     res = defaultdict(list)
     for algo in algos:
         res[algo].append(num_points[algo])
@@ -264,4 +258,9 @@ def compile_results(scores, distances, num_points, algos):
 
 
 if __name__ == "__main__":
-    test_bwc()
+    if sys.argv[1:2] == ["sweep"]:
+        # parameter sweep on all the cores: python tests/test_bwc.py sweep [test name]
+        pymeos_initialize()
+        sweep_dataset_case(sys.argv[2] if len(sys.argv) > 2 else "AIS_10")
+    else:
+        test_bwc()
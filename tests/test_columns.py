@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from pymeos import pymeos_initialize, TGeomPointInst
+
+from src.helpers.columns import PointColumns, parse_points
+from src.helpers.utility import to_epoch_ns
+
+
+def test_parse_points_as_meos():
+    pymeos_initialize()
+    texts = [
+        "POINT(12.5 55.5)@2021-01-01 00:00:00+00",
+        "POINT(12.612345678901 55.6)@2021-01-01 00:00:01.5+00",
+        "POINT(-0.1 1e-05)@2021-01-01 01:00:10.123456+01",
+        " point( 3 4 ) @ 2020-12-31 23:59:59+00 ",
+        "SRID=4326;POINT(1 2)@2021-06-01 12:00:00-05:30",
+    ]
+    t, x, y, srid = parse_points(texts)
+    instants = [TGeomPointInst(text.strip()) for text in texts]
+    assert t.tolist() == [to_epoch_ns(instant.timestamp()) for instant in instants]
+    assert x.tolist() == [instant.value().x for instant in instants]
+    assert y.tolist() == [instant.value().y for instant in instants]
+    assert srid == 4326
+
+    columns = PointColumns.from_text([1, 1], ["SRID=25832;" + texts[0], "SRID=25832;" + texts[1]])
+    assert columns.srid == 25832 and np.array_equal(columns.t, t[:2])
+
+    with pytest.raises(ValueError):
+        parse_points(["SRID=25832;" + texts[0], "SRID=4326;" + texts[1]])
+    with pytest.raises(ValueError):
+        parse_points([texts[0], "POINT(1)@2021-01-01"])
+
+    # python ids get a fixed width dtype, which is shared and saved without pickle
+    columns = PointColumns.from_text(np.array(["a1", "b22"], dtype=object), texts[:2])
+    assert columns.tid.dtype == np.dtype("<U3") and columns.tid.tolist() == ["a1", "b22"]
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from pymeos import pymeos_initialize, TGeomPointInst
+
+from src.bwc.runner import compress_all
+import src.helpers.data_loader as data_loader
+from tests.test_streaming import random_columns
+
+
+def test_columns_are_memory_mapped(tmp_path, monkeypatch):
+    pymeos_initialize()
+    monkeypatch.setattr(data_loader, "PREPROCESSED", f"{tmp_path}/")
+    points = pd.DataFrame(
+        {
+            "id": [219000001, 219000002, 219000001],
+            "sog": [10.5, 3.0, 11.0],
+            "cog": [90.0, 180.0, 91.5],
+            "point": [
+                TGeomPointInst("SRID=4326;POINT(12.5 55.5)@2021-01-01 00:00:00+00"),
+                TGeomPointInst("SRID=4326;POINT(12.6 55.6)@2021-01-01 00:00:01.5+00"),
+                TGeomPointInst("SRID=4326;POINT(12.51 55.49)@2021-01-01 00:00:10+00"),
+            ],
+        }
+    )
+    assert not data_loader.has_columns("ais")
+    data_loader.save_columns("ais", points)
+    assert data_loader.has_columns("ais")
+
+    columns = data_loader.load_columns("ais")
+    assert isinstance(columns.x.base, np.memmap) or isinstance(columns.x, np.memmap)
+    assert columns.tid.tolist() == points["id"].tolist()
+    assert np.array_equal(columns.t - columns.t[0], [0, 1_500_000_000, 10_000_000_000])
+    assert columns.x.tolist() == [12.5, 12.6, 12.51] and columns.cog.tolist() == [90.0, 180.0, 91.5]
+    assert columns.srid == 4326
+
+    data_loader.save_columns("birds", points[["id", "point"]].assign(id=["a", "b", "a"]))
+    birds = data_loader.load_columns("birds")
+    assert birds.tid.tolist() == ["a", "b", "a"] and birds.sog is None
+
+
+def test_chunks_feed_the_compressors(tmp_path, monkeypatch):
+    pymeos_initialize()
+    monkeypatch.setattr(data_loader, "PREPROCESSED", f"{tmp_path}/")
+    columns = random_columns(n_points=300, seed=6)
+    points = pd.DataFrame({"id": columns.tid, "point": [p.point for p in columns.priority_points()]})
+    data_loader.save_df_to_csv("ais", points)
+
+    batches = list(data_loader.read_csv_chunks("ais", ["id", "point"], chunk_size=64))
+    assert [len(batch) for batch in batches] == [64, 64, 64, 64, 44]
+    assert np.array_equal(np.concatenate([batch.t for batch in batches]), columns.t)
+
+    options = dict(window_lenght=timedelta(minutes=2), limit=10, nys=None)
+    chunked = compress_all(data_loader.read_csv_chunks("ais", ["id", "point"], 64), ["BWC_STTrace"], **options)
+    expected = compress_all(columns, ["BWC_STTrace"], **options)
+    assert chunked[1] == expected[1]
+    assert chunked[0]["BWC_STTrace"].equals(expected[0]["BWC_STTrace"])
@@ -0,0 +1,70 @@
+from datetime import timedelta
+import pickle
+
+import numpy as np
+import pandas as pd
+from pymeos import pymeos_initialize
+from pyproj import Proj
+
+from src.bwc.runner import ALGORITHMS, compress_all
+from src.helpers.distance import HAVERSINE, Equirectangular, Planar, distance_backend
+from src.helpers.utility import LazyTrajectory, PriorityPoint, assess_algorithms, compile_trips
+from tests.test_streaming import random_columns
+
+
+def test_backends_match_haversine():
+    rng = np.random.default_rng(0)
+    x1, y1 = rng.uniform(12, 13, 10_000), rng.uniform(55, 56.5, 10_000)
+    x2, y2 = x1 + rng.uniform(-0.5, 0.5, 10_000), y1 + rng.uniform(-0.5, 0.5, 10_000)
+    exact = HAVERSINE.distances(x1, y1, x2, y2)
+
+    # documented bounds
+    assert np.all(np.abs(Equirectangular().distances(x1, y1, x2, y2) - exact) <= 1e-4 * exact)
+    assert np.all(np.abs(Equirectangular(55.75).distances(x1, y1, x2, y2) - exact) <= 0.02 * exact)
+    planar = Planar(Proj("EPSG:32633", preserve_units=True))
+    assert np.all(np.abs(planar.distances(x1, y1, x2, y2) - exact) <= 5e-3 * exact)  # ellipsoid
+
+    for backend in (HAVERSINE, Equirectangular(), planar):
+        scalar = [backend.distance(*values) for values in zip(x1[:50], y1[:50], x2[:50], y2[:50])]
+        assert np.allclose(scalar, backend.distances(x1[:50], y1[:50], x2[:50], y2[:50]))
+
+    # the planar SED interpolates the projected coordinates of the points
+    a, b, c = (
+        PriorityPoint.from_values(1, t * 10**9, x, y, px=px, py=py)
+        for t, x, y, px, py in ((0, 12.5, 55.5, 0.0, 0.0), (5, 12.5, 55.5, 50.0, 30.0), (10, 12.5, 55.5, 100.0, 0.0))
+    )
+    assert planar.sed(a, b, c) == 30.0
+    assert pickle.loads(pickle.dumps(planar)).name == planar.name
+    assert distance_backend("planar", planar.nys).name == planar.name
+
+
+def test_compression_with_approximate_backends():
+    pymeos_initialize()
+    columns = random_columns(n_points=600, seed=4)
+    nys = Proj("EPSG:32632", preserve_units=True)
+    options = dict(window_lenght=timedelta(minutes=2), limit=10, nys=nys, eval_delta=timedelta(seconds=10))
+    algorithms = [name for name in ALGORITHMS if name not in {"BWC_STTrace_Imp", "BWC_STTrace_Imp_Delay"}]
+
+    exact_trips, _ = compress_all(columns, algorithms, **options)
+    for backend in (Equirectangular(), Planar(nys)):
+        trips, _ = compress_all(columns, algorithms, distance=backend, **options)
+        for name in algorithms:
+            assert sorted(trips[name].index) == sorted(exact_trips[name].index)
+            kept = sum(len(t.arrays[0]) for t in trips[name].trajectory)
+            assert kept == sum(len(t.arrays[0]) for t in exact_trips[name].trajectory)
+
+    originals = pd.DataFrame(
+        {
+            "trajectory": {
+                tid: LazyTrajectory(columns.t[rows], columns.x[rows], columns.y[rows])
+                for tid in np.unique(columns.tid).tolist()
+                for rows in [columns.tid == tid]
+            }
+        }
+    )
+    trips = compile_trips(exact_trips, originals)
+    exact, _ = assess_algorithms(trips, algorithms, "Original", timedelta(seconds=10))
+    for backend, tolerance in ((Equirectangular(), 1e-4), (Planar(nys), 5e-3)):
+        scores, _ = assess_algorithms(trips, algorithms, "Original", timedelta(seconds=10), distance=backend)
+        for name in algorithms:
+            assert np.isclose(scores[name], exact[name], rtol=tolerance)
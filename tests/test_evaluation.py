@@ -0,0 +1,156 @@
+from datetime import timedelta
+
+import pickle
+
+import haversine
+import numpy as np
+import pandas as pd
+import pytest
+from pymeos import pymeos_initialize, TGeomPointInst, TGeomPointSeq
+
+from src.bwc.windowed import trips_dataframe, unordered_trips
+from src.helpers.parallel_evaluation import assess_algorithms_parallel
+from src.helpers.reference_cache import ReferenceCache
+from src.helpers.shared_arrays import SharedArrays
+from src.helpers.utility import (
+    algorithm_scores,
+    assess_algorithms,
+    assess_algorithms_statistics,
+    assess_single_trajectory,
+    convert_points_trips,
+    distance_statistics,
+    LazyTrajectory,
+    PriorityPoint,
+    trajectory_arrays,
+)
+
+
+def reference_assessment(compressed, original, delta):
+    """The former MEOS based loop of assess_single_trajectory."""
+    score, nmbr_instants, mx_distance = 0, 0, 0
+    time = compressed.start_instant().timestamp() + delta
+    while time < compressed.end_instant().timestamp():
+        point = original.value_at_timestamp(time)
+        point_compressed = compressed.value_at_timestamp(time)
+        distance = haversine.haversine((point.y, point.x), (point_compressed.y, point_compressed.x)) * 1000
+        mx_distance = max(mx_distance, distance)
+        score += distance
+        nmbr_instants += 1
+        time += delta
+    return score, nmbr_instants, mx_distance
+
+
+def random_trip(rng, n=60):
+    seconds = np.cumsum(rng.integers(5, 60, n))
+    x = 12.5 + np.cumsum(rng.normal(0, 1e-3, n))
+    y = 55.5 + np.cumsum(rng.normal(0, 1e-3, n))
+    instants = [
+        TGeomPointInst(f"SRID=4326;POINT({x[i]} {y[i]})@2021-01-01 00:00:00+00") for i in range(n)
+    ]
+    instants = [inst.shift_time(timedelta(seconds=int(s))) for inst, s in zip(instants, seconds)]
+    original = TGeomPointSeq.from_instants(instants, upper_inc=True)
+    kept = sorted(set(rng.choice(np.arange(1, n - 1), n // 4, replace=False)) | {0, n - 1})
+    compressed = TGeomPointSeq.from_instants([instants[i] for i in kept], upper_inc=True)
+    return original, compressed
+
+
+def test_vectorized_assessment_matches_meos_loop():
+    pymeos_initialize()
+    rng = np.random.default_rng(0)
+    delta = timedelta(seconds=15)
+    trips = [random_trip(rng) for _ in range(12)]
+
+    for original, compressed in trips:
+        expected = reference_assessment(compressed, original, delta)
+        score, points, mx_distance = assess_single_trajectory(compressed, original, delta)
+        assert points == expected[1]
+        assert np.isclose(score, expected[0], rtol=1e-9)
+        assert np.isclose(mx_distance, expected[2], rtol=1e-9)
+
+    df = pd.DataFrame(trips, columns=["Original", "algo"])
+    stats = assess_algorithms_statistics(df, ["algo"], "Original", delta)
+    assert stats.loc["algo", "max_error"] >= stats.loc["algo", "p99_error"] >= stats.loc["algo", "med_error"]
+
+
+def test_reference_cache_gives_same_statistics():
+    pymeos_initialize()
+    rng = np.random.default_rng(1)
+    delta = timedelta(seconds=15)
+    df = pd.DataFrame([random_trip(rng) for _ in range(12)], columns=["Original", "algo"])
+    expected = assess_algorithms_statistics(df, ["algo"], "Original", delta)
+
+    cache = ReferenceCache()
+    for _ in range(2):
+        stats = assess_algorithms_statistics(df, ["algo"], "Original", delta, cache=cache)
+        pd.testing.assert_frame_equal(stats, expected)
+    assert cache.hits > 0
+
+    small = ReferenceCache(max_bytes=1)
+    assess_algorithms_statistics(df, ["algo"], "Original", delta, cache=small)
+    assert len(small.entries) == 1
+
+
+def test_parallel_assessment_matches_serial():
+    pymeos_initialize()
+    rng = np.random.default_rng(2)
+    delta = timedelta(seconds=15)
+    df = pd.DataFrame([random_trip(rng) for _ in range(25)], columns=["Original", "algo"])
+    df["other"] = df["Original"]
+
+    scores, mx_distances = assess_algorithms(df, ["algo", "other"], "Original", delta)
+    parallel_scores, parallel_mx = assess_algorithms_parallel(
+        df, ["algo", "other"], "Original", delta, workers=2
+    )
+    assert parallel_scores == scores
+    assert parallel_mx == mx_distances
+
+
+def test_object_arrays_are_not_shared():
+    with pytest.raises(ValueError, match="'tid'"):
+        SharedArrays({"t": np.arange(3), "tid": np.array(["a", "b", "c"], dtype=object)})
+    with SharedArrays({"tid": np.array(["a", "bc"])}) as shared:
+        assert shared["tid"].tolist() == ["a", "bc"]
+
+
+def test_lazy_trips_match_meos_sequences():
+    pymeos_initialize()
+    rng = np.random.default_rng(3)
+    trips = [random_trip(rng, n=20)[0] for _ in range(4)]
+    points = pd.DataFrame(
+        [(tid, instant) for tid, trip in enumerate(trips) for instant in trip.instants()],
+        columns=["id", "point"],
+    )
+    points.loc[len(points)] = [9, trips[0].start_instant()]  # single point trip, dropped
+
+    lazy = convert_points_trips(points)
+    assert lazy.index.tolist() == [0, 1, 2, 3]
+    for tid, trajectory in lazy["trajectory"].items():
+        assert trajectory._sequence is None
+        for expected, computed in zip(trajectory_arrays(trips[tid]), trajectory_arrays(trajectory)):
+            assert np.array_equal(expected, computed)
+        assert trajectory == trips[tid] and trajectory.num_instants() == 20
+
+        # built from the arrays only, and picklable
+        copy = pickle.loads(pickle.dumps(trajectory))
+        assert copy._sequence is None and copy == trips[tid]
+        assert LazyTrajectory(*copy.arrays) == trips[tid]
+
+
+def test_finalized_trips_skip_empty_and_check_order():
+    pymeos_initialize()
+    points = [PriorityPoint.from_values(1, t * 10**9, 12.5 + t / 1e3, 55.5) for t in (0, 5, 3)]
+    trips = trips_dataframe({0: [], 1: points[:2], 2: points})
+    assert trips.index.tolist() == [1, 2]
+    assert unordered_trips(trips) == [2]
+    assert trips.loc[1, "trajectory"].num_instants() == 2
+
+
+def test_empty_trips_count_as_zero_max():
+    # a trip shorter than the evaluation delta has no evaluated points
+    distances = [np.array([1.0, 3.0]), np.empty(0), np.array([2.0, 6.0, 4.0])]
+    scores, maxima = algorithm_scores({"algo": distances})
+    stats = distance_statistics(distances)
+    assert maxima["algo"] == [3.0, 0, 6.0]
+    assert scores["algo"] == stats["avg_error"] == 16 / 5
+    assert stats["avg_max"] == np.mean(maxima["algo"]) == 3.0
+    assert stats["med_max"] == np.median(maxima["algo"]) == 3.0
@@ -0,0 +1,36 @@
+from src.helpers.linked_trip import LinkedTrip, link
+
+
+class Node:
+    def __init__(self, name):
+        self.name = name
+        self.prev = None
+        self.next = None
+
+
+def test_linked_trip_remove_relinks_neighboors():
+    kept = Node("kept")
+    trip = LinkedTrip()
+    a, b, c = Node("a"), Node("b"), Node("c")
+    for node in (a, b, c):
+        trip.append(node, kept)
+
+    assert a.prev is kept and kept.next is a
+    assert [n.name for n in trip] == ["a", "b", "c"]
+
+    trip.remove(a)
+    assert trip.head is b and b.prev is kept and kept.next is b
+
+    trip.remove(c)
+    assert trip.tail is b and b.next is None and len(trip) == 1
+
+
+def test_linked_trip_stops_at_tail():
+    trip = LinkedTrip()
+    a, buffered = Node("a"), Node("buffered")
+    trip.append(a)
+    link(a, buffered)
+
+    assert [n.name for n in trip] == ["a"]
+    trip.remove(a)
+    assert buffered.prev is None and len(trip) == 0 and trip.head is None
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import shapely
+from pymeos import pymeos_initialize, STBox, TGeomPointSeq
+
+from src.helpers.utility import convert_points_trips
+from src.preprocess.preprocess import (
+    clean_all_trips,
+    clean_points,
+    construct_instants,
+    filter_outliers,
+    filter_points_area,
+    filter_points_period,
+    filter_points_tbox,
+    raw_points_from_clean_trips,
+)
+
+
+def random_raw(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.integers(0, 2 * 3600, n))
+    return pd.DataFrame(
+        {
+            "id": rng.integers(0, 5, n),
+            "Timestamp": [f"2021-01-01 {s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}+00" for s in seconds],
+            "Longitude": np.round(12.4 + rng.random(n) * 0.8, 6),
+            "Latitude": np.round(55.4 + rng.random(n) * 0.4, 6),
+        }
+    )
+
+
+def test_vectorized_filters_match_meos_predicates():
+    pymeos_initialize()
+    instants = construct_instants(random_raw(), 4326)
+    box = STBox(xmin=12.47, ymax=55.75, xmax=13.08, ymin=55.48, srid=4326)
+    period = STBox(tmin="2021-01-01 00:10:00+00", tmax="2021-01-01 01:00:00+00", tmax_inc=False)
+
+    expected_box = instants[[point.ever_intersects(box) for point in instants["point"]]]
+    expected_period = instants[[point.is_temporally_contained_in(period) for point in instants["point"]]]
+    # with the array columns of construct_instants, and from the MEOS points only
+    for points in (instants, instants.drop(columns=["t", "x", "y"])):
+        assert filter_points_tbox(points, box).index.equals(expected_box.index)
+        assert filter_points_period(points, period).index.equals(expected_period.index)
+
+    assert set(filter_outliers(instants, [1, 3])["id"]) == set(instants["id"]) - {1, 3}
+
+    triangle = shapely.Polygon([(12.5, 55.5), (13.0, 55.5), (12.75, 55.75)])
+    expected = [triangle.intersects(point.value()) for point in instants["point"]]
+    assert filter_points_area(instants, triangle).index.equals(instants[expected].index)
+    two = filter_points_area(instants, [triangle, shapely.box(12.4, 55.4, 12.5, 55.5)])
+    assert len(two) > sum(expected)
+
+
+def test_native_cleaning_matches_movingpandas():
+    pymeos_initialize()
+    raw = random_raw(n=300, seed=1)
+    rng = np.random.default_rng(1)
+    # slow trips, with spikes
+    for tid in range(5):
+        trip = raw["id"] == tid
+        raw.loc[trip, "Longitude"] = 12.5 + np.cumsum(rng.normal(0, 1e-3, trip.sum()))
+        raw.loc[trip, "Latitude"] = 55.5 + np.cumsum(rng.normal(0, 1e-3, trip.sum()))
+    spikes = rng.choice(len(raw), 25, replace=False)
+    raw.loc[spikes, "Longitude"] += rng.choice([-1, 1], 25) * 0.05
+    raw.loc[len(raw)] = [9, "2021-01-01 01:00:00+00", 12.5, 55.5]  # single point trip
+    instants = construct_instants(raw, 4326)
+
+    trips = clean_all_trips(convert_points_trips(instants), vmax=15)
+    expected = raw_points_from_clean_trips(trips, instants)
+    cleaned = clean_points(instants, vmax=15)
+    assert len(cleaned) < len(instants) - 20
+    assert cleaned.index.equals(expected.index)
+    assert clean_points(instants, vmax=15, workers=2).index.equals(expected.index)
+
+
+def test_raw_points_join_keeps_columns_and_order():
+    pymeos_initialize()
+    raw = random_raw(n=200, seed=2)
+    raw["sog"] = np.arange(len(raw)) / 10
+    instants = construct_instants(raw, 4326).sample(frac=1, random_state=0)  # any order
+    trips = convert_points_trips(instants.sort_values("t"))
+    # drop some instants from the trips
+    trips["trajectory"] = [
+        TGeomPointSeq.from_instants(trajectory.instants()[::2], upper_inc=True)
+        for trajectory in trips["trajectory"]
+    ]
+
+    # the former O(N.M) loop
+    id_ts = {tid: [i.timestamp() for i in trajectory.instants()] for tid, trajectory in trips.trajectory.items()}
+    expected = [index for index, point in instants.iterrows() if point.point.timestamp() in id_ts.get(point.id, [])]
+
+    joined = raw_points_from_clean_trips(trips, instants)
+    assert joined.index.tolist() == expected
+    assert joined["sog"].tolist() == instants.loc[expected, "sog"].tolist()
+    assert joined.dtypes.equals(instants.dtypes)
@@ -0,0 +1,36 @@
+from src.helpers.priority_queue import PriorityQueue
+
+
+class Item:
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+        self.heap_seq = None
+
+
+def test_pop_min_breaks_ties_by_insertion_order():
+    queue = PriorityQueue()
+    a, b, c = Item("a", 1), Item("b", 1), Item("c", 0)
+    for item in (a, b, c):
+        queue.add(item)
+    queue.update(a, 1)  # re-inserted after b, as a SortedList remove + add
+
+    assert [queue.pop_min().name for _ in range(3)] == ["c", "b", "a"]
+    assert len(queue) == 0
+
+
+def test_update_remove_and_clear():
+    queue = PriorityQueue()
+    items = [Item(i, i) for i in range(200)]
+    for item in items:
+        queue.add(item)
+    for item in items[:150]:
+        queue.update(item, item.priority + 1000)
+    queue.remove(items[150])
+
+    assert len(queue) == 199
+    assert queue.pop_min() is items[151]
+    assert sorted(item.name for item in queue) == list(range(150)) + list(range(152, 200))
+
+    queue.clear()
+    assert len(queue) == 0 and list(queue) == []
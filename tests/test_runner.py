@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from pymeos import pymeos_initialize
+from pyproj import Proj
+import pytest
+
+from src.bwc.runner import ALGORITHMS, compress_all, create_compressor
+from tests.test_streaming import random_columns
+
+
+def test_single_pass_and_workers_match_separate_runs():
+    pymeos_initialize()
+    columns = random_columns(n_points=600, seed=3)
+    nys = Proj("EPSG:32632", preserve_units=True)
+    options = dict(window_lenght=timedelta(minutes=2), limit=10, nys=nys, eval_delta=timedelta(seconds=10))
+
+    single_pass = compress_all(columns, ALGORITHMS, **options)
+    in_workers = compress_all(columns, ALGORITHMS, workers=2, **options)
+
+    for name in ALGORITHMS:
+        compressor = create_compressor(name, **options)
+        compressor.push_many(columns)
+        compressor.close()
+        compressor.finalize_trips()
+        expected = compressor.compressed_trips()
+
+        for trips, delays in (single_pass, in_workers):
+            assert delays[name] == compressor.delays
+            assert sorted(trips[name].index) == sorted(expected.index)
+            for tid, trajectory in expected.trajectory.items():
+                assert trips[name].trajectory[tid] == trajectory
+
+
+def test_workers_need_columns():
+    columns = random_columns(n_points=100, seed=1)
+    options = dict(window_lenght=timedelta(minutes=2), limit=10, nys=None)
+    with pytest.raises(ValueError, match="iterable of batches"):
+        compress_all(iter([columns]), ["BWC_Squish"], workers=2, **options)
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+import haversine
+import numpy as np
+from pymeos import pymeos_initialize, TGeomPointInst, TGeomPointSeq
+
+from src.helpers.utility import (
+    PriorityPoint,
+    removal_error,
+    sed_distance,
+    sed_distances,
+    timedelta_ns,
+    to_epoch_ns,
+    trajectory_arrays,
+)
+
+TOLERANCE = 1e-6  # meters
+
+
+def meos_sed(A, B, C):
+    """Reference SED using MEOS interpolation and the haversine package."""
+    synchronized = TGeomPointSeq.from_instants([A, C]).value_at_timestamp(B.timestamp())
+    point = B.value()
+    return haversine.haversine((point.y, point.x), (synchronized.y, synchronized.x)) * 1000
+
+
+def instant(x, y, time):
+    return TGeomPointInst(f"SRID=4326;POINT({x} {y})@2021-01-01 {time}+00")
+
+
+def raw(inst):
+    return inst.value().x, inst.value().y, to_epoch_ns(inst.timestamp())
+
+
+def test_sed_matches_meos():
+    pymeos_initialize()
+    rng = np.random.default_rng(0)
+    triples = []
+    for _ in range(50):
+        xs = 12.5 + rng.random(3) * 0.5
+        ys = 55.5 + rng.random(3) * 0.2
+        secs = np.sort(rng.choice(3600, 3, replace=False))
+        # whole seconds: pymeos drops the sub-second part in value_at_timestamp
+        times = [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in secs]
+        triples.append([instant(x, y, t) for x, y, t in zip(xs, ys, times)])
+
+    expected = np.array([meos_sed(*triple) for triple in triples])
+    scalar = np.array([sed_distance(*raw(A), *raw(B), *raw(C)) for A, B, C in triples])
+    columns = np.array([[raw(inst) for inst in triple] for triple in triples], dtype=object)
+    batched = sed_distances(
+        *(np.array(columns[:, i, j].tolist()) for i in range(3) for j in range(3))
+    )
+
+    assert np.allclose(scalar, expected, rtol=0, atol=TOLERANCE)
+    assert np.allclose(batched, expected, rtol=0, atol=TOLERANCE)
+
+
+def meos_removal_error(previous, point, following, correct_trip, eval_delta):
+    """Reference removal error: the former MEOS loop of the STTrace_Imp variants."""
+
+    def distance_point_line_time(point, time, line):
+        synchronized_point = line.value_at_timestamp(time)
+        return haversine.haversine((point.y, point.x), (synchronized_point.y, synchronized_point.x)) * 1000
+
+    old_curve = TGeomPointSeq.from_instants([previous, point, following])
+    new_curve = TGeomPointSeq.from_instants([previous, following])
+    old_error, new_error = 0, 0
+    time = previous.timestamp() + eval_delta
+    end = following.timestamp()
+    if time >= end:
+        return 0
+    while time < end:
+        correct_point = correct_trip.value_at_timestamp(time)
+        new_error += distance_point_line_time(correct_point, time, new_curve)
+        old_error += distance_point_line_time(correct_point, time, old_curve)
+        time += eval_delta
+    return new_error - old_error
+
+
+def test_removal_error_matches_meos():
+    pymeos_initialize()
+    rng = np.random.default_rng(1)
+    secs = np.sort(rng.choice(3600, 40, replace=False))
+    xs = 12.5 + np.cumsum(rng.normal(0, 1e-3, 40))
+    ys = 55.5 + np.cumsum(rng.normal(0, 1e-3, 40))
+    times = [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in secs]
+    instants = [instant(x, y, t) for x, y, t in zip(xs, ys, times)]
+    original = TGeomPointSeq.from_instants(instants, upper_inc=True)
+    reference = trajectory_arrays(original)
+    eval_delta = timedelta(seconds=15)
+
+    for _ in range(30):
+        i, j, k = np.sort(rng.choice(40, 3, replace=False))
+        previous, point, following = (PriorityPoint({"id": 1, "point": instants[n]}) for n in (i, j, k))
+        expected = meos_removal_error(instants[i], instants[j], instants[k], original, eval_delta)
+        error = removal_error(previous, point, following, reference, timedelta_ns(eval_delta))
+        assert np.isclose(error, expected, rtol=0, atol=TOLERANCE * (secs[k] - secs[i]))
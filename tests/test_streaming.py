@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+import numpy as np
+from pymeos import pymeos_initialize
+
+from src.bwc.sttrace_delay import BWC_STTrace_Delay
+from src.bwc.squish import BWC_SQUISH
+from src.helpers.columns import PointColumns
+from src.helpers.utility import to_epoch_ns
+
+
+def random_columns(n_trips=8, n_points=400, seed=0):
+    rng = np.random.default_rng(seed)
+    tid = rng.integers(0, n_trips, n_points)
+    t = 1_609_459_200_000_000_000 + np.cumsum(rng.integers(1, 10, n_points)) * 1_000_000_000
+    x = 12.5 + np.cumsum(rng.normal(0, 1e-3, n_points))
+    y = 55.5 + np.cumsum(rng.normal(0, 1e-3, n_points))
+    return PointColumns(tid, t, x, y)
+
+
+def test_stream_yields_same_points_as_compress():
+    pymeos_initialize()
+    columns = random_columns()
+    for algorithm in (BWC_SQUISH, BWC_STTrace_Delay):
+        offline = algorithm(columns, timedelta(minutes=2), 10, None)
+        offline.compress()
+
+        received = []
+        online = algorithm(None, timedelta(minutes=2), 10, None, on_window=lambda time, kept: received.append(time))
+        streamed = {}
+        for time, kept in online.stream(columns.priority_points()):
+            for tid, points in kept.items():
+                assert all(point.t <= time for point in points)
+                streamed.setdefault(tid, []).extend(point.t for point in points)
+
+        assert len(received) > 1
+        expected = {
+            tid: [to_epoch_ns(inst.timestamp()) for inst in trajectory.instants()]
+            for tid, trajectory in offline.trips.trajectory.items()
+        }
+        assert streamed == expected
+
+
+def test_sink_keeps_only_trip_tails():
+    pymeos_initialize()
+    columns = random_columns(seed=1)
+    for algorithm in (BWC_SQUISH, BWC_STTrace_Delay):
+        offline = algorithm(columns, timedelta(minutes=2), 10, None)
+        offline.compress()
+
+        sunk = {}
+
+        def sink(time, kept):
+            for tid, points in kept.items():
+                sunk.setdefault(tid, []).extend(point.t for point in points)
+
+        bounded = algorithm(columns, timedelta(minutes=2), 10, None, sink=sink)
+        bounded.compress()
+
+        assert max(map(len, bounded.trips.values())) <= algorithm.tail_length
+        assert bounded.delays == [] and bounded.delay_count == len(offline.delays)
+        assert abs(bounded.mean_delay() - sum(offline.delays) / len(offline.delays)) < 1e-9
+        assert sunk == {
+            tid: [to_epoch_ns(inst.timestamp()) for inst in trajectory.instants()]
+            for tid, trajectory in offline.trips.trajectory.items()
+        }
+
+
+def test_idle_trips_are_evicted():
+    pymeos_initialize()
+    # each vessel is only active during 8 minutes, one after the other
+    rng = np.random.default_rng(2)
+    t = np.sort(rng.choice(60 * 60, 600, replace=False))
+    tid = t // (10 * 60)
+    columns = PointColumns(
+        tid,
+        1_609_459_200_000_000_000 + t * 1_000_000_000,
+        12.5 + rng.random(600) * 1e-2,
+        55.5 + rng.random(600) * 1e-2,
+    )
+    for algorithm in (BWC_SQUISH, BWC_STTrace_Delay):
+        offline = algorithm(columns, timedelta(minutes=2), 10, None)
+        offline.compress()
+        assert not offline.last_seen  # no bookkeeping without eviction
+
+        sizes = []
+        evicting = algorithm(columns, timedelta(minutes=2), 10, None, idle_ttl=timedelta(minutes=5))
+        evicting.on_window = lambda time, kept: sizes.append(len(evicting.last_seen))
+        evicting.compress()
+
+        assert max(sizes) <= 2 and len(evicting.evicted_trips) == 5
+        # the buffered points of the delayed variants are kept at eviction, not at the end
+        assert len(evicting.delays) == len(offline.delays)
+        assert sum(evicting.delays) <= sum(offline.delays)
+        assert sorted(evicting.trips.index) == sorted(offline.trips.index)
+        for tid, trajectory in offline.trips.trajectory.items():
+            assert evicting.trips.trajectory[tid] == trajectory
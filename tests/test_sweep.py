@@ -0,0 +1,150 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from pymeos import pymeos_initialize
+from pyproj import Proj
+
+from src.bwc.runner import ALGORITHMS, compress_all
+from src.bwc.sweep import run_sweep, write_sweep
+from src.helpers.columns import PointColumns
+from src.helpers.result_cache import ResultCache
+from src.helpers.utility import assess_algorithms, compile_trips, convert_points_trips
+from tests.test_bwc import assess_compression
+from tests.test_streaming import random_columns
+
+
+def test_sweep_matches_serial_assessment(tmp_path):
+    pymeos_initialize()
+    columns = random_columns(n_trips=12, n_points=800, seed=4)
+    points = pd.DataFrame({"id": columns.tid, "point": [p.point for p in columns.priority_points()]})
+    trips = convert_points_trips(points)
+    nys = Proj("EPSG:32632", preserve_units=True)
+    cells = [("short", timedelta(minutes=1), 4), ("long", timedelta(minutes=5), 20)]
+    algorithms = list(ALGORITHMS)
+
+    results, delays = run_sweep(
+        columns, algorithms, cells, nys, timedelta(seconds=5), timedelta(seconds=10), workers=2
+    )
+
+    assert list(delays.columns) == ["short", "long"]
+    for subtest, window_length, limit in cells:
+        compressed, algorithm_delays = compress_all(
+            columns, algorithms, window_length, limit, nys, timedelta(seconds=10), init_trips=trips
+        )
+        scores, mx_distances = assess_algorithms(
+            compile_trips(compressed, trips), algorithms, "Original", timedelta(seconds=5)
+        )
+        for algorithm in algorithms:
+            row = results.loc[(subtest, algorithm)]
+            assert np.isclose(row["avg_error"], scores[algorithm], rtol=1e-12)
+            assert np.isclose(row["max_max"], max(mx_distances[algorithm]), rtol=1e-12)
+            assert row["#kept"] == sum(len(t.arrays[0]) for t in compressed[algorithm].trajectory)
+            assert np.isclose(delays.loc[algorithm, subtest], np.mean(algorithm_delays[algorithm]))
+
+    write_sweep(results, delays, folder=f"{tmp_path}/")
+    errors = pd.read_csv(tmp_path / "all.csv", index_col=0)
+    assert list(errors.index) == algorithms and list(errors.columns) == ["short", "long"]
+    assert errors.loc["BWC_DR", "long"] == results.loc[("long", "BWC_DR"), "avg_error"]
+
+
+def test_trips_without_kept_points_are_skipped():
+    pymeos_initialize()
+    # more new trips in a window than the limit: the first points of some trips are dropped
+    columns = random_columns(n_trips=40, n_points=600, seed=6)
+    points = pd.DataFrame({"id": columns.tid, "point": [p.point for p in columns.priority_points()]})
+    trips = convert_points_trips(points)
+    nys = Proj("EPSG:32632", preserve_units=True)
+    cells = [("crowded", timedelta(minutes=5), 3)]
+    algorithms = ["BWC_Squish", "BWC_STTrace", "BWC_DR"]
+
+    results, _ = run_sweep(columns, algorithms, cells, nys, timedelta(seconds=5), timedelta(seconds=10), workers=1)
+
+    compressed, _ = compress_all(columns, algorithms, timedelta(minutes=5), 3, nys)
+    assert any(len(compressed[algorithm]) < len(trips) for algorithm in algorithms)
+    scores, _ = assess_algorithms(
+        compile_trips(compressed, trips), algorithms, "Original", timedelta(seconds=5)
+    )
+    for algorithm in algorithms:
+        assert np.isclose(results.loc[("crowded", algorithm), "avg_error"], scores[algorithm], rtol=1e-12)
+
+
+def test_kept_points_before_normalization():
+    pymeos_initialize()
+    # straight constant speed trips: MEOS normalizes their sequences to a few instants
+    n_trips, n_points = 4, 100
+    step = np.arange(n_points * n_trips) // n_trips
+    tid = np.tile(np.arange(n_trips), n_points)
+    columns = PointColumns(
+        tid, 1_609_459_200_000_000_000 + step * 10**10, 12.5 + step * 1e-4, 55.5 + tid * 1e-2
+    )
+    points = pd.DataFrame({"id": columns.tid, "point": [p.point for p in columns.priority_points()]})
+    trips = convert_points_trips(points)
+    nys = Proj("EPSG:32632", preserve_units=True)
+    algorithms = ["BWC_Squish", "BWC_STTrace", "BWC_DR"]
+    cells = [("straight", timedelta(minutes=5), 40)]
+
+    results, _ = run_sweep(columns, algorithms, cells, nys, timedelta(seconds=5), timedelta(seconds=10), workers=1)
+
+    compressed, _ = compress_all(columns, algorithms, timedelta(minutes=5), 40, nys)
+    serial = assess_compression(compile_trips(compressed, trips), algorithms, timedelta(seconds=5))
+    for algorithm in algorithms:
+        kept = results.loc[("straight", algorithm), "#kept"]
+        assert kept == serial.loc[algorithm, "#kept"]
+        assert kept > sum(t.num_instants() for t in compressed[algorithm].trajectory)
+
+
+def test_cached_cells_are_not_recomputed(tmp_path):
+    pymeos_initialize()
+    dataset = tmp_path / "points.csv"
+    dataset.write_text("id,point\n")
+    columns = random_columns(n_trips=6, n_points=300, seed=5)
+    nys = Proj("EPSG:32632", preserve_units=True)
+    cells = [("cell", timedelta(minutes=2), 8)]
+    options = dict(eval_delta=timedelta(seconds=5), bwc_sttrace_delta=timedelta(seconds=10), workers=2)
+
+    cache = ResultCache(dataset, folder=f"{tmp_path}/cache/")
+    results, delays = run_sweep(columns, ["BWC_Squish", "BWC_DR"], cells, nys, cache=cache, **options)
+    assert len(list((tmp_path / "cache").rglob("*.npz"))) == 2
+
+    # everything is read from the cache, the points are not needed anymore
+    cached = run_sweep(None, ["BWC_Squish", "BWC_DR"], cells, nys, cache=cache, **options)
+    pd.testing.assert_frame_equal(cached[0], results)
+    pd.testing.assert_frame_equal(cached[1], delays)
+
+    # another projection, dataset content or code version gives other keys
+    key = cache.key("BWC_DR", *cells[0][1:], timedelta(seconds=5), timedelta(seconds=10), nys)[0]
+    other_nys = Proj("EPSG:25832", preserve_units=True)
+    assert cache.key("BWC_DR", *cells[0][1:], timedelta(seconds=5), timedelta(seconds=10), other_nys)[0] != key
+    dataset.write_text("id,point\n1,\n")
+    assert ResultCache(dataset).key("BWC_DR", *cells[0][1:], timedelta(seconds=5), timedelta(seconds=10), nys)[0] != key
+
+    # a folder of columns is keyed on the content of its files
+    folder = tmp_path / "columns"
+    folder.mkdir()
+    np.save(folder / "t.npy", columns.t)
+    key = ResultCache(folder).key("BWC_DR", *cells[0][1:], timedelta(seconds=5), timedelta(seconds=10), nys)[0]
+    np.save(folder / "t.npy", columns.t + 1)
+    assert ResultCache(folder).key("BWC_DR", *cells[0][1:], timedelta(seconds=5), timedelta(seconds=10), nys)[0] != key
+
+
+def test_cached_cells_with_string_ids(tmp_path):
+    pymeos_initialize()
+    dataset = tmp_path / "points.csv"
+    dataset.write_text("id,point\n")
+    columns = random_columns(n_trips=4, n_points=200, seed=6)
+    tid = np.array([f"trip {tid}" for tid in columns.tid.tolist()], dtype=object)  # as read by pandas
+    columns = PointColumns(tid, columns.t, columns.x, columns.y)
+    nys = Proj("EPSG:32632", preserve_units=True)
+    cells = [("cell", timedelta(minutes=2), 8)]
+    options = dict(eval_delta=timedelta(seconds=5), bwc_sttrace_delta=timedelta(seconds=10), workers=2)
+
+    cache = ResultCache(dataset, folder=f"{tmp_path}/cache/")
+    results, _ = run_sweep(columns, ["BWC_DR"], cells, nys, cache=cache, **options)
+    cached, _ = run_sweep(None, ["BWC_DR"], cells, nys, cache=cache, **options)
+    pd.testing.assert_frame_equal(cached, results)
+
+    key = cache.key("BWC_DR", *cells[0][1:], timedelta(seconds=5), timedelta(seconds=10), nys)
+    with pytest.raises(ValueError):
+        cache.store(*key, {"tid": tid})